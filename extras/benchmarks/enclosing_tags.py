@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pygemstones.io.file as f
+
+
+# -----------------------------------------------------------------------------
+def create_source(path, functions):
+    """
+    Create a synthetic C source file with many functions.
+
+    Arguments:
+        path : str
+
+        functions : int
+
+    Returns:
+        None
+    """
+
+    with open(path, "w") as source:
+        for x in range(functions):
+            source.write("int function_{0}(int value) {{\n".format(x))
+            source.write("    if (value > {0}) {{\n".format(x))
+            source.write('        printf("value: %d\\n", value);\n')
+            source.write("    }\n")
+            source.write("    return value;\n")
+            source.write("}\n\n")
+
+
+# -----------------------------------------------------------------------------
+def find_blocks_one_by_one(path):
+    """
+    Find all blocks calling get_file_line_numbers_with_enclosing_tags for each block.
+
+    Arguments:
+        path : str
+
+    Returns:
+        list[list[int]]
+    """
+
+    blocks = []
+    start_from = 1
+
+    while True:
+        block = f.get_file_line_numbers_with_enclosing_tags(
+            path, "{", "}", start_from=start_from
+        )
+
+        if not block:
+            return blocks
+
+        blocks.append(block)
+        start_from = block[1] + 1
+
+
+# -----------------------------------------------------------------------------
+def main():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for functions in [100, 1000, 5000]:
+            path = os.path.join(temp_dir, "source.c")
+            create_source(path, functions)
+
+            start = time.perf_counter()
+            blocks = find_blocks_one_by_one(path)
+            one_by_one = time.perf_counter() - start
+
+            start = time.perf_counter()
+            all_blocks = f.get_file_blocks_with_enclosing_tags(path, "{", "}")
+            one_pass = time.perf_counter() - start
+
+            assert blocks == all_blocks
+
+            print(
+                "{0} lines: one by one {1:.3f}s, one pass {2:.3f}s ({3:.1f}x)".format(
+                    functions * 7, one_by_one, one_pass, one_by_one / one_pass
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
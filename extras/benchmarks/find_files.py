@@ -0,0 +1,115 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pygemstones.io.file as f
+
+
+# -----------------------------------------------------------------------------
+def create_tree(path, depth, dirs_per_level, files_per_dir):
+    """
+    Create a synthetic directory tree for the benchmark.
+
+    Arguments:
+        path : str
+
+        depth : int
+
+        dirs_per_level : int
+
+        files_per_dir : int
+
+    Returns:
+        None
+    """
+
+    f.create_dir(path)
+
+    for x in range(files_per_dir):
+        open(os.path.join(path, "file{0}.txt".format(x)), "w").close()
+
+    if depth > 0:
+        for x in range(dirs_per_level):
+            create_tree(
+                os.path.join(path, "dir{0}".format(x)),
+                depth - 1,
+                dirs_per_level,
+                files_per_dir,
+            )
+
+
+# -----------------------------------------------------------------------------
+def measure(path, workers, rounds=5):
+    """
+    Return the best time of some rounds of a recursive find_files call.
+
+    Arguments:
+        path : str
+
+        workers : int
+
+        rounds : int
+
+    Returns:
+        tuple[float, int]
+    """
+
+    best = None
+    count = 0
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        count = len(f.find_files(path, "*.txt", recursive=True, workers=workers))
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, count
+
+
+# -----------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark find_files workers")
+    parser.add_argument("--dir", default=None, help="directory to create the tree")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="milliseconds added to each directory listing to simulate NFS",
+    )
+    args = parser.parse_args()
+
+    if args.latency > 0:
+        scandir = os.scandir
+
+        def slow_scandir(path):
+            time.sleep(args.latency / 1000)
+            return scandir(path)
+
+        os.scandir = slow_scandir
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as temp_dir:
+        tree_path = os.path.join(temp_dir, "tree")
+        create_tree(tree_path, depth=5, dirs_per_level=4, files_per_dir=10)
+
+        rounds = 1 if args.latency > 0 else 5
+
+        serial, count = measure(tree_path, 1, rounds)
+        print("serial: {0:.3f}s ({1} files)".format(serial, count))
+
+        for workers in [2, 4, 8, 16]:
+            elapsed, _ = measure(tree_path, workers, rounds)
+            print(
+                "workers={0}: {1:.3f}s ({2:.2f}x)".format(
+                    workers, elapsed, serial / elapsed
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,111 @@
+import array
+import codecs
+import collections
+import concurrent.futures
+import contextlib
+import filecmp
 import fnmatch
+import functools
+import hashlib
+import heapq
+import io
+import itertools
+import mmap
 import os
+import re
 import shutil
 import stat
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from types import ModuleType
+from typing import Dict, Optional
+
+fcntl: Optional[ModuleType]
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import pygemstones.type.string as s
+import pygemstones.util.log as l
+
+# linux ioctl to clone file data (reflink)
+FICLONE = 0x40049409
+
+# ways to copy a file
+LINK_MODES = ["copy", "hardlink", "reflink", "auto"]
+
+# platforms that can walk and remove entries relative to an open directory
+FD_TREE_SUPPORTED = (
+    hasattr(os, "O_DIRECTORY")
+    and hasattr(os, "O_NOFOLLOW")
+    and os.scandir in os.supports_fd
+    and os.open in os.supports_dir_fd
+    and os.unlink in os.supports_dir_fd
+    and os.rmdir in os.supports_dir_fd
+)
+
+# suffix of hidden trash directories used by recreate_dir on background mode
+TRASH_DIR_SUFFIX = ".trash-"
+
+# trash directories being removed in background threads
+_pending_removals: Dict[str, threading.Thread] = {}
+_pending_removals_lock = threading.Lock()
+
+# entries stat by each worker of disk_usage
+DISK_USAGE_CHUNK_SIZE = 1024
+
+# file types accepted by find_files filter
+FILE_TYPES = ["file", "link", "other"]
+
+# encodings where searching the encoded bytes is the same as searching the text
+BYTE_SEARCH_ENCODINGS = ["utf-8", "ascii", "cp1252"]
+
+# line indexes cached by file path
+LINE_INDEX_CACHE_SIZE = 32
+
+_line_index_cache: "collections.OrderedDict[str, tuple]" = collections.OrderedDict()
+_line_index_lock = threading.Lock()
+
+# file contents cache, disabled by default
+_content_cache: "collections.OrderedDict[str, tuple]" = collections.OrderedDict()
+_content_cache_lock = threading.Lock()
+_content_cache_max_bytes = 0
+_content_cache_bytes = 0
+_content_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+# buffer used to read files while hashing, one per thread
+HASH_BUFFER_SIZE = 1024 * 1024
+
+_hash_buffers = threading.local()
 
 
 # -----------------------------------------------------------------------------
-def remove_dir(path):
+def remove_dir(path, workers=1):
     """
     Remove directory with all errors and exceptions ignored.
 
+    Sub directories can be removed in parallel using workers parameter, on platforms
+    that can remove entries relative to an open directory, like Linux.
+
     Arguments:
         path : str
 
+        workers : int
+
     Returns:
         None
     """
 
     try:
-        shutil.rmtree(path)
+        if workers > 1 and FD_TREE_SUPPORTED:
+            _remove_dir_fd(path, workers)
+        else:
+            shutil.rmtree(path)
     except Exception:
         pass
 
@@ -36,923 +124,4712 @@ def remove_file(path):
 
     if os.path.isfile(path):
         os.remove(path)
+        _invalidate_content_cache(path)
 
 
 # -----------------------------------------------------------------------------
-def remove_files(path, pattern, recursive=False, follow_links=False):
+def remove_files(path, pattern, recursive=False, follow_links=False, exclude=None):
     """
     Remove files with pattern with all errors and exceptions ignored.
 
     The search algorithm can find files recursively if enabled by the parameter.
 
+    Files and directories matching the exclude patterns are kept and excluded
+    directories are not entered.
+
+    On platforms that can remove entries relative to an open directory, like Linux,
+    files are removed by name from the open directory, so the full path is not
+    resolved again for each file.
+
     Arguments:
         path : str
 
-        pattern : str | list[str]
+        pattern : str | list[str] | PatternMatcher
 
         recursive : bool
 
+        exclude : str | list[str] | PathPatternMatcher
+
     Returns:
         None
     """
 
-    if recursive:
-        for root, _, files in os.walk(path, topdown=False, followlinks=follow_links):
-            for name in files:
-                base_path = os.path.join(root, name)
-                filename = os.path.basename(base_path)
-
-                if isinstance(pattern, list):
-                    if [
-                        pattern_item
-                        for pattern_item in pattern
-                        if fnmatch.fnmatch(filename, pattern_item)
-                    ]:
-                        os.remove(base_path)
-                elif pattern == "*" or fnmatch.fnmatch(filename, pattern):
-                    os.remove(base_path)
-    else:
-        for item in os.listdir(path):
-            base_path = os.path.join(path, item)
+    matcher = compile_pattern(pattern)
+    exclude = compile_path_pattern(exclude)
 
-            if os.path.isfile(base_path):
-                filename = os.path.basename(base_path)
+    if FD_TREE_SUPPORTED:
+        _remove_files_fd(path, matcher, recursive, follow_links, exclude)
+        return
 
-                if isinstance(pattern, list):
-                    if [
-                        pattern_item
-                        for pattern_item in pattern
-                        if fnmatch.fnmatch(filename, pattern_item)
-                    ]:
-                        os.remove(base_path)
-                elif pattern == "*" or fnmatch.fnmatch(filename, pattern):
-                    os.remove(base_path)
+    for entry in _walk_entries(
+        path, recursive, follow_links, files=True, exclude=exclude
+    ):
+        if matcher.match(entry.name):
+            os.remove(entry.path)
 
 
 # -----------------------------------------------------------------------------
-def remove_dirs(path, pattern, recursive=False, follow_links=False):
+def remove_dirs(path, pattern, recursive=False, follow_links=False, exclude=None):
     """
     Remove directories with pattern with all errors and exceptions ignored.
 
     The search algorithm can find directories recursively if enabled by the parameter.
 
+    Directories matching the exclude patterns are kept and not entered.
+
     Arguments:
         path : str
 
-        pattern : str | list[str]
+        pattern : str | list[str] | PatternMatcher
 
         recursive : bool
 
+        exclude : str | list[str] | PathPatternMatcher
+
     Returns:
         None
     """
 
-    if recursive:
-        for root, dirs, _ in os.walk(path, topdown=False, followlinks=follow_links):
-            for name in dirs:
-                base_path = os.path.join(root, name)
-                dirname = os.path.basename(base_path)
-
-                if isinstance(pattern, list):
-                    if [
-                        pattern_item
-                        for pattern_item in pattern
-                        if fnmatch.fnmatch(dirname, pattern_item)
-                    ]:
-                        remove_dir(base_path)
-                elif pattern == "*" or fnmatch.fnmatch(dirname, pattern):
-                    remove_dir(base_path)
-    else:
-        for item in os.listdir(path):
-            base_path = os.path.join(path, item)
+    matcher = compile_pattern(pattern)
+    exclude = compile_path_pattern(exclude)
 
-            if os.path.isdir(base_path):
-                if isinstance(pattern, list):
-                    if [
-                        pattern_item
-                        for pattern_item in pattern
-                        if fnmatch.fnmatch(item, pattern_item)
-                    ]:
-                        remove_dir(base_path)
-                elif pattern == "*" or fnmatch.fnmatch(item, pattern):
-                    remove_dir(base_path)
+    for entry in _walk_entries(
+        path, recursive, follow_links, dirs=True, exclude=exclude
+    ):
+        if matcher.match(entry.name):
+            remove_dir(entry.path)
 
 
 # -----------------------------------------------------------------------------
-def find_files(path, pattern, recursive=False, follow_links=False):
+def _remove_dir_fd(path, workers=1):
     """
-    Find all files which match the pattern.
-
-    The search algorithm can find files recursively if enabled by the parameter.
+    Remove a directory using file descriptors of the open directories, removing sub directories in parallel.
 
     Arguments:
         path : str
 
-        pattern : str | list[str]
-
-        recursive : bool
+        workers : int
 
     Returns:
-        list[str]
+        None
     """
 
-    results = []
+    root_fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
 
-    if dir_exists(path):
-        if recursive:
-            for root, _, files in os.walk(
-                path, topdown=False, followlinks=follow_links
-            ):
-                for name in files:
-                    base_path = os.path.join(root, name)
-                    filename = os.path.basename(base_path)
-
-                    if isinstance(pattern, list):
-                        if [
-                            pattern_item
-                            for pattern_item in pattern
-                            if fnmatch.fnmatch(filename, pattern_item)
-                        ]:
-                            results.append(base_path)
-                    elif pattern == "*" or fnmatch.fnmatch(filename, pattern):
-                        results.append(base_path)
-        else:
-            for item in os.listdir(path):
-                base_path = os.path.join(path, item)
-
-                if os.path.isfile(base_path):
-                    filename = os.path.basename(base_path)
-
-                    if isinstance(pattern, list):
-                        if [
-                            pattern_item
-                            for pattern_item in pattern
-                            if fnmatch.fnmatch(filename, pattern_item)
-                        ]:
-                            results.append(base_path)
-                    elif pattern == "*" or fnmatch.fnmatch(filename, pattern):
-                        results.append(base_path)
+    try:
+        subdirs = _unlink_dir_fd_entries(root_fd)
 
-    return results
+        def remove(name):
+            _remove_tree_fd(root_fd, name)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(remove, subdirs))
+    finally:
+        os.close(root_fd)
+
+    os.rmdir(path)
 
 
 # -----------------------------------------------------------------------------
-def find_dirs(path, pattern, recursive=False, follow_links=False):
+def _remove_tree_fd(parent_fd, name):
     """
-    Find all directories which match the pattern.
+    Remove a directory relative to an open parent directory with all its contents.
 
-    The search algorithm can find directories recursively if enabled by the parameter.
+    Only one file descriptor is kept open for each level of the tree.
 
     Arguments:
-        path : str
-
-        pattern : str | list[str]
+        parent_fd : int
 
-        recursive : bool
+        name : str
 
     Returns:
-        list[str]
+        None
     """
 
-    results = []
+    fd = os.open(name, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=parent_fd)
+    stack = [(fd, name, None)]
 
-    if dir_exists(path):
-        if recursive:
-            for root, dirs, _ in os.walk(path, topdown=False, followlinks=follow_links):
-                for name in dirs:
-                    base_path = os.path.join(root, name)
-                    dirname = os.path.basename(base_path)
-
-                    if isinstance(pattern, list):
-                        if [
-                            pattern_item
-                            for pattern_item in pattern
-                            if fnmatch.fnmatch(dirname, pattern_item)
-                        ]:
-                            results.append(base_path)
-                    elif pattern == "*" or fnmatch.fnmatch(dirname, pattern):
-                        results.append(base_path)
-        else:
-            for item in os.listdir(path):
-                base_path = os.path.join(path, item)
+    try:
+        while stack:
+            fd, name, subdirs = stack[-1]
 
-                if os.path.isdir(base_path):
-                    if isinstance(pattern, list):
-                        if [
-                            pattern_item
-                            for pattern_item in pattern
-                            if fnmatch.fnmatch(item, pattern_item)
-                        ]:
-                            results.append(base_path)
-                    elif pattern == "*" or fnmatch.fnmatch(item, pattern):
-                        results.append(base_path)
+            if subdirs is None:
+                subdirs = iter(_unlink_dir_fd_entries(fd))
+                stack[-1] = (fd, name, subdirs)
 
-        return results
+            sub_name = next(subdirs, None)
+
+            if sub_name is not None:
+                sub_fd = os.open(
+                    sub_name, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW, dir_fd=fd
+                )
+                stack.append((sub_fd, sub_name, None))
+                continue
+
+            # all entries were removed
+            stack.pop()
+            os.close(fd)
+            os.rmdir(name, dir_fd=stack[-1][0] if stack else parent_fd)
+    finally:
+        for fd, name, subdirs in stack:
+            os.close(fd)
 
 
 # -----------------------------------------------------------------------------
-def current_dir():
+def _unlink_dir_fd_entries(fd):
     """
-    Get current directory with path normalized.
+    Remove all non directory entries of an open directory and return the sub directory names.
 
     Arguments:
-        None
+        fd : int
 
     Returns:
-        str
+        list[str]
     """
 
-    return normalize_path(os.getcwd())
+    subdirs = []
+
+    with os.scandir(fd) as scanner:
+        entries = list(scanner)
+
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            subdirs.append(entry.name)
+        else:
+            try:
+                os.unlink(entry.name, dir_fd=fd)
+            except FileNotFoundError:
+                pass
+
+    return subdirs
 
 
 # -----------------------------------------------------------------------------
-def normalize_path(path):
+def _remove_files_fd(path, matcher, recursive=False, follow_links=False, exclude=None):
     """
-    Get path normalized to unix pattern.
+    Remove the files matching a pattern using file descriptors of the open directories.
+
+    Only one file descriptor is kept open for each level of the tree. Errors while
+    opening directories are ignored on recursive mode, like os.walk.
 
     Arguments:
         path : str
 
+        matcher : PatternMatcher
+
+        recursive : bool
+
+        follow_links : bool
+
+        exclude : PathPatternMatcher
+
     Returns:
-        str
+        None
     """
 
-    if path:
-        path = path.replace("\\", "/")
-        return path
+    flags = os.O_RDONLY | os.O_DIRECTORY
+
+    if not follow_links:
+        sub_flags = flags | os.O_NOFOLLOW
     else:
-        return ""
+        sub_flags = flags
 
+    try:
+        root_fd = os.open(path, flags)
+    except OSError:
+        if recursive:
+            return
 
-# -----------------------------------------------------------------------------
-def create_dir(path):
-    """
-    Create directory and all intermediate ones with all errors ignored.
+        raise
 
-    Arguments:
-        path : str
+    stack = []
 
-    Returns:
-        None
-    """
+    try:
+        stack.append((root_fd, "", None))
 
-    if path:
-        if not os.path.isdir(path):
-            os.makedirs(path, exist_ok=True)
+        while stack:
+            fd, rel_top, subdirs = stack[-1]
+
+            if subdirs is None:
+                subdirs = iter(
+                    _remove_files_fd_entries(fd, rel_top, matcher, recursive, exclude)
+                )
+                stack[-1] = (fd, rel_top, subdirs)
+
+            sub_name = next(subdirs, None)
+
+            if sub_name is None:
+                stack.pop()
+                os.close(fd)
+                continue
+
+            try:
+                sub_fd = os.open(sub_name, sub_flags, dir_fd=fd)
+            except OSError:
+                continue
+
+            rel_path = rel_top + "/" + sub_name if rel_top else sub_name
+            stack.append((sub_fd, rel_path, None))
+    finally:
+        for fd, rel_top, subdirs in stack:
+            os.close(fd)
 
 
 # -----------------------------------------------------------------------------
-def set_file_content(file_path, content, method="w"):
+def _remove_files_fd_entries(fd, rel_path, matcher, recursive, exclude):
     """
-    Set file content creating directory and file, if not exists.
+    Remove the matching files of an open directory and return the sub directory names to be visited.
 
     Arguments:
-        file_path : str
+        fd : int
 
-        contents : str
+        rel_path : str
 
-        method : str
+        matcher : PatternMatcher
+
+        recursive : bool
+
+        exclude : PathPatternMatcher
 
     Returns:
-        None
+        list[str]
     """
 
-    file_dir = os.path.dirname(file_path)
+    try:
+        with os.scandir(fd) as scanner:
+            entries = [(entry, _entry_is_dir(entry)) for entry in scanner]
+    except OSError:
+        if recursive:
+            return []
 
-    remove_file(file_path)
-    create_dir(file_dir)
+        raise
 
-    with open(file_path, method) as f:
-        f.write(content)
-        f.close()
+    if exclude is not None:
+        entries = _exclude_entries(entries, exclude, rel_path)
+
+    subdirs = []
+
+    for entry, is_dir in entries:
+        if is_dir:
+            if recursive:
+                subdirs.append(entry.name)
+        elif (recursive or _entry_is_file(entry)) and matcher.match(entry.name):
+            os.unlink(entry.name, dir_fd=fd)
+
+    return subdirs
 
 
 # -----------------------------------------------------------------------------
-def get_file_contents(file_path, method="r"):
+def find_files(
+    path,
+    pattern,
+    recursive=False,
+    follow_links=False,
+    workers=1,
+    exclude=None,
+    max_depth=None,
+    min_size=None,
+    max_size=None,
+    newer_than=None,
+    older_than=None,
+    file_type=None,
+):
     """
-    Get file contents.
+    Find all files which match the pattern.
+
+    The search algorithm can find files recursively if enabled by the parameter.
+
+    Recursive searches can scan sub directories in parallel using workers parameter,
+    and in this case the results are sorted.
+
+    Files and directories can be excluded with gitignore style patterns using exclude
+    parameter. Excluded directories are pruned, so their contents are never scanned.
+
+    Results can be filtered while walking by depth, where 1 means the entries of path,
+    size in bytes, modification timestamp (newer_than and older_than, in seconds since
+    epoch) and file type ("file", "link" or "other"). Filters use the entry stat data
+    gathered by the walker, so each entry is stat at most once.
 
     Arguments:
-        file_path : str
+        path : str
 
-        method : str
+        pattern : str | list[str] | PatternMatcher
 
-    Returns:
-        str
-    """
+        recursive : bool
 
-    with open(file_path, method) as f:
-        contents = f.read()
-        f.close()
+        follow_links : bool
 
-    return contents
+        workers : int
 
+        exclude : str | list[str] | PathPatternMatcher
 
-# -----------------------------------------------------------------------------
-def copy_file(from_path, to_path):
-    """
-    Copy file from one path to other, creating the target directory if not exists.
+        max_depth : int
 
-    Arguments:
-        from_path : str
+        min_size : int
 
-        to_path : str
+        max_size : int
+
+        newer_than : float
+
+        older_than : float
+
+        file_type : str
 
     Returns:
-        None
+        list[str]
     """
 
-    create_dir(os.path.dirname(to_path))
-    shutil.copyfile(from_path, to_path)
+    if recursive and workers > 1:
+        if not dir_exists(path):
+            return []
+
+        matcher = compile_pattern(pattern)
+        entry_filter = _compile_entry_filter(
+            min_size, max_size, newer_than, older_than, file_type
+        )
+        entries = _walk_entries_parallel(
+            path,
+            workers,
+            follow_links,
+            files=True,
+            exclude=compile_path_pattern(exclude),
+            max_depth=max_depth,
+        )
+
+        return sorted(
+            entry.path
+            for entry in entries
+            if matcher.match(entry.name)
+            and (entry_filter is None or entry_filter(entry))
+        )
+
+    return list(
+        iter_files(
+            path,
+            pattern,
+            recursive,
+            follow_links,
+            exclude=exclude,
+            max_depth=max_depth,
+            min_size=min_size,
+            max_size=max_size,
+            newer_than=newer_than,
+            older_than=older_than,
+            file_type=file_type,
+        )
+    )
 
 
 # -----------------------------------------------------------------------------
-def copy_files(source_path, target_path, pattern, symlinks=True):
+def find_dirs(
+    path,
+    pattern,
+    recursive=False,
+    follow_links=False,
+    workers=1,
+    exclude=None,
+    max_depth=None,
+    newer_than=None,
+    older_than=None,
+):
     """
-    Copy files inside source path to target path which match the pattern, creating the target directory if not exists.
+    Find all directories which match the pattern.
 
-    Symbolic links can be copied too.
+    The search algorithm can find directories recursively if enabled by the parameter.
 
-    Arguments:
-        source_path : str
+    Recursive searches can scan sub directories in parallel using workers parameter,
+    and in this case the results are sorted.
 
-        target_path : str
+    Directories can be excluded with gitignore style patterns using exclude parameter.
+    Excluded directories are pruned, so their contents are never scanned.
 
-        pattern : str | list[str]
+    Results can be filtered while walking by depth, where 1 means the entries of path,
+    and modification timestamp (newer_than and older_than, in seconds since epoch).
 
-        symlinks : bool
+    Arguments:
+        path : str
 
-    Returns:
-        None
-    """
+        pattern : str | list[str] | PatternMatcher
 
-    for item in os.listdir(source_path):
-        base_path = os.path.join(source_path, item)
+        recursive : bool
 
-        if os.path.isfile(base_path):
-            filename = os.path.basename(base_path)
+        follow_links : bool
 
-            if isinstance(pattern, list):
-                if [
-                    pattern_item
-                    for pattern_item in pattern
-                    if fnmatch.fnmatch(filename, pattern_item)
-                ]:
-                    create_dir(target_path)
-                    shutil.copyfile(
-                        base_path,
-                        os.path.join(target_path, filename),
-                        follow_symlinks=symlinks,
-                    )
-            elif pattern == "*" or fnmatch.fnmatch(filename, pattern):
-                create_dir(target_path)
-                shutil.copyfile(
-                    base_path,
-                    os.path.join(target_path, filename),
-                    follow_symlinks=symlinks,
-                )
+        workers : int
 
+        exclude : str | list[str] | PathPatternMatcher
 
-# -----------------------------------------------------------------------------
-def copy_all(src_path, dst_path):
-    """
-    Copy all files and directories inside source path to target path, creating the target directory if not exists.
+        max_depth : int
 
-    Arguments:
-        source_path : str
+        newer_than : float
 
-        target_path : str
+        older_than : float
 
     Returns:
-        None
+        list[str]
     """
 
-    create_dir(dst_path)
+    if dir_exists(path):
+        if recursive and workers > 1:
+            matcher = compile_pattern(pattern)
+            entry_filter = _compile_entry_filter(
+                newer_than=newer_than, older_than=older_than
+            )
+            entries = _walk_entries_parallel(
+                path,
+                workers,
+                follow_links,
+                dirs=True,
+                exclude=compile_path_pattern(exclude),
+                max_depth=max_depth,
+            )
 
-    for item in os.listdir(src_path):
-        src_item = os.path.join(src_path, item)
-        dst_item = os.path.join(dst_path, item)
+            return sorted(
+                entry.path
+                for entry in entries
+                if matcher.match(entry.name)
+                and (entry_filter is None or entry_filter(entry))
+            )
 
-        if os.path.isdir(src_item):
-            shutil.copytree(src_item, dst_item, dirs_exist_ok=True, symlinks=True)
-        else:
-            shutil.copy2(src_item, dst_item)
+        return list(
+            iter_dirs(
+                path,
+                pattern,
+                recursive,
+                follow_links,
+                exclude=exclude,
+                max_depth=max_depth,
+                newer_than=newer_than,
+                older_than=older_than,
+            )
+        )
 
 
 # -----------------------------------------------------------------------------
-def home_dir():
+def iter_files(
+    path,
+    pattern,
+    recursive=False,
+    follow_links=False,
+    entries=False,
+    exclude=None,
+    max_depth=None,
+    min_size=None,
+    max_size=None,
+    newer_than=None,
+    older_than=None,
+    file_type=None,
+):
     """
-    Get the user home directory.
-
-    Arguments:
-        None
+    Iterate over all files which match the pattern, yielding them as they are found.
 
-    Returns:
-        str
-    """
+    The search algorithm can find files recursively if enabled by the parameter.
 
-    return os.path.expanduser("~")
+    The os.DirEntry objects can be yielded instead of paths using entries parameter,
+    so the type and stat information already gathered can be reused.
 
+    Entries matching the exclude patterns are skipped and excluded directories are not entered.
 
-# -----------------------------------------------------------------------------
-def file_exists(path):
-    """
-    Check and return if a file exists or not.
+    Results can be filtered while walking by depth, where 1 means the entries of path,
+    size in bytes, modification timestamp (newer_than and older_than, in seconds since
+    epoch) and file type ("file", "link" or "other"). Filters use the entry stat data
+    gathered by the walker, so each entry is stat at most once.
 
     Arguments:
         path : str
 
-    Returns:
-        bool
-    """
-
-    if os.path.exists(path) and os.path.isfile(path):
-        return True
+        pattern : str | list[str] | PatternMatcher
 
-    return False
+        recursive : bool
 
+        follow_links : bool
 
-# -----------------------------------------------------------------------------
-def dir_exists(path):
-    """
-    Check and return if a directory exists or not.
+        entries : bool
 
-    Arguments:
-        path : str
+        exclude : str | list[str] | PathPatternMatcher
 
-    Returns:
-        bool
-    """
+        max_depth : int
 
-    if os.path.exists(path) and os.path.isdir(path):
-        return True
+        min_size : int
 
-    return False
+        max_size : int
 
+        newer_than : float
 
-# -----------------------------------------------------------------------------
-def recreate_dir(path):
-    """
-    Remove directory and create a new one.
+        older_than : float
 
-    Arguments:
-        path : str
+        file_type : str
 
     Returns:
-        None
+        iterator[str] | iterator[os.DirEntry]
     """
 
-    remove_dir(path)
-    create_dir(path)
+    if not dir_exists(path):
+        return
+
+    matcher = compile_pattern(pattern)
+    exclude = compile_path_pattern(exclude)
+    entry_filter = _compile_entry_filter(
+        min_size, max_size, newer_than, older_than, file_type
+    )
+
+    for entry in _walk_entries(
+        path, recursive, follow_links, files=True, exclude=exclude, max_depth=max_depth
+    ):
+        if matcher.match(entry.name) and (entry_filter is None or entry_filter(entry)):
+            yield entry if entries else entry.path
 
 
 # -----------------------------------------------------------------------------
-def copy_dir(src, dst, symlinks=False, ignore=None, ignore_file=None):
+def iter_dirs(
+    path,
+    pattern,
+    recursive=False,
+    follow_links=False,
+    entries=False,
+    exclude=None,
+    max_depth=None,
+    newer_than=None,
+    older_than=None,
+):
     """
-    Copy a directory from one path to other.
+    Iterate over all directories which match the pattern, yielding them as they are found.
 
-    Symbolic links can be copied too.
+    The search algorithm can find directories recursively if enabled by the parameter.
 
-    A function can be used in ignore parameter to check if files from a directory will be ignored or not.
+    The os.DirEntry objects can be yielded instead of paths using entries parameter,
+    so the type and stat information already gathered can be reused.
 
-    A function can be used in ignore_file parameter to check if individual files will be ignored or not.
+    Entries matching the exclude patterns are skipped and excluded directories are not entered.
+
+    Results can be filtered while walking by depth, where 1 means the entries of path,
+    and modification timestamp (newer_than and older_than, in seconds since epoch).
 
     Arguments:
-        src : str
+        path : str
 
-        dst : str
+        pattern : str | list[str] | PatternMatcher
 
-        symlinks : bool
+        recursive : bool
 
-        ignore: function
+        follow_links : bool
 
-        ignore_file: function
+        entries : bool
 
-    Returns:
-        None
-    """
+        exclude : str | list[str] | PathPatternMatcher
+
+        max_depth : int
+
+        newer_than : float
+
+        older_than : float
+
+    Returns:
+        iterator[str] | iterator[os.DirEntry]
+    """
+
+    if not dir_exists(path):
+        return
+
+    matcher = compile_pattern(pattern)
+    exclude = compile_path_pattern(exclude)
+    entry_filter = _compile_entry_filter(newer_than=newer_than, older_than=older_than)
+
+    for entry in _walk_entries(
+        path, recursive, follow_links, dirs=True, exclude=exclude, max_depth=max_depth
+    ):
+        if matcher.match(entry.name) and (entry_filter is None or entry_filter(entry)):
+            yield entry if entries else entry.path
+
+
+# -----------------------------------------------------------------------------
+def _walk_entries(
+    path,
+    recursive=False,
+    follow_links=False,
+    files=False,
+    dirs=False,
+    exclude=None,
+    max_depth=None,
+):
+    """
+    Walk a directory with os.scandir and yield the entries of the requested kind.
+
+    Entries are yielded bottom-up, like os.walk with topdown disabled, so callers
+    can remove what they receive. The DirEntry type cache is reused, so no extra
+    stat call is made per entry on most platforms.
+
+    On recursive mode every non-directory entry is a file, like os.walk, and
+    errors are ignored. Otherwise only regular files are returned and errors are
+    raised, like os.listdir.
+
+    Entries matching the exclude matcher are dropped when their directory is
+    scanned, so excluded directories are never entered. Directories deeper than
+    max_depth are not entered too, where depth 1 is the entries of path.
+
+    Arguments:
+        path : str
+
+        recursive : bool
+
+        follow_links : bool
+
+        files : bool
+
+        dirs : bool
+
+        exclude : PathPatternMatcher
+
+        max_depth : int
+
+    Returns:
+        iterator[os.DirEntry]
+    """
+
+    stack = [(path, "", 0, None)]
+
+    while stack:
+        top, rel_top, depth, entries = stack.pop()
+
+        if entries is not None:
+            # all sub directories were already visited
+            for entry, is_dir in entries:
+                if is_dir:
+                    if dirs:
+                        yield entry
+                elif files and (recursive or _entry_is_file(entry)):
+                    yield entry
+
+            continue
+
+        entries = _scan_dir(
+            top, ignore_errors=recursive, exclude=exclude, rel_path=rel_top
+        )
+
+        if entries is None:
+            continue
+
+        stack.append((top, rel_top, depth, entries))
+
+        if recursive and (max_depth is None or depth + 1 < max_depth):
+            for entry, is_dir in reversed(entries):
+                if is_dir and (follow_links or not entry.is_symlink()):
+                    rel_path = rel_top + "/" + entry.name if rel_top else entry.name
+                    stack.append((entry.path, rel_path, depth + 1, None))
+
+
+# -----------------------------------------------------------------------------
+def _walk_entries_parallel(
+    path,
+    workers,
+    follow_links=False,
+    files=False,
+    dirs=False,
+    exclude=None,
+    max_depth=None,
+):
+    """
+    Walk a directory recursively scanning sub directories in a thread pool and return the entries of the requested kind.
+
+    The number of directories being scanned at the same time is bounded by the
+    number of workers, which helps on filesystems where each listing waits for
+    a network round trip. Errors are ignored like os.walk.
+
+    Arguments:
+        path : str
+
+        workers : int
+
+        follow_links : bool
+
+        files : bool
+
+        dirs : bool
+
+        exclude : PathPatternMatcher
+
+        max_depth : int
+
+    Returns:
+        list[os.DirEntry]
+    """
+
+    results = []
+    queue = collections.deque([(path, "", 0)])
+    pending = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        while queue or pending:
+            while queue and len(pending) < workers * 2:
+                top, rel_top, depth = queue.popleft()
+                future = executor.submit(_scan_dir, top, True, exclude, rel_top)
+                pending[future] = (rel_top, depth)
+
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+
+            for future in done:
+                rel_top, depth = pending.pop(future)
+                descend = max_depth is None or depth + 1 < max_depth
+
+                for entry, is_dir in future.result() or []:
+                    if is_dir:
+                        if descend and (follow_links or not entry.is_symlink()):
+                            rel_path = (
+                                rel_top + "/" + entry.name if rel_top else entry.name
+                            )
+                            queue.append((entry.path, rel_path, depth + 1))
+
+                        if dirs:
+                            results.append(entry)
+                    elif files:
+                        results.append(entry)
+
+    return results
+
+
+# -----------------------------------------------------------------------------
+def _scan_dir(path, ignore_errors=False, exclude=None, rel_path=""):
+    """
+    Scan a directory and return a list with the entries and if they are directories.
+
+    When errors are ignored and the directory cannot be scanned None is returned.
+
+    Entries matching the exclude matcher are dropped, using their path relative
+    to the walked directory, which is the rel_path of the scanned directory.
+
+    Arguments:
+        path : str
+
+        ignore_errors : bool
+
+        exclude : PathPatternMatcher
+
+        rel_path : str
+
+    Returns:
+        list[tuple[os.DirEntry, bool]]
+    """
+
+    try:
+        with os.scandir(path) as scanner:
+            entries = [(entry, _entry_is_dir(entry)) for entry in scanner]
+    except OSError:
+        if ignore_errors:
+            return None
+
+        raise
+
+    if exclude is not None:
+        entries = _exclude_entries(entries, exclude, rel_path)
+
+    return entries
+
+
+# -----------------------------------------------------------------------------
+def _exclude_entries(entries, exclude, rel_path=""):
+    """
+    Drop the scanned entries matching the exclude matcher.
+
+    Arguments:
+        entries : list[tuple[os.DirEntry, bool]]
+
+        exclude : PathPatternMatcher
+
+        rel_path : str
+
+    Returns:
+        list[tuple[os.DirEntry, bool]]
+    """
+
+    prefix = rel_path + "/" if rel_path else ""
+
+    return [
+        (entry, is_dir)
+        for entry, is_dir in entries
+        if not exclude.match(prefix + entry.name, is_dir)
+    ]
+
+
+# -----------------------------------------------------------------------------
+def _entry_is_dir(entry):
+    """
+    Check if a directory entry is a directory, following symbolic links and ignoring errors.
+
+    Arguments:
+        entry : os.DirEntry
+
+    Returns:
+        bool
+    """
+
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+# -----------------------------------------------------------------------------
+def _entry_is_file(entry):
+    """
+    Check if a directory entry is a file, following symbolic links and ignoring errors.
+
+    Arguments:
+        entry : os.DirEntry
+
+    Returns:
+        bool
+    """
+
+    try:
+        return entry.is_file()
+    except OSError:
+        return False
+
+
+# -----------------------------------------------------------------------------
+def _compile_entry_filter(
+    min_size=None, max_size=None, newer_than=None, older_than=None, file_type=None
+):
+    """
+    Get a function that check the size, modification time and type of a directory entry, or None when there is nothing to check.
+
+    The entry type is checked first, since it is known without a stat call on most platforms,
+    and the entry stat is only used for size and time filters. Entries that cannot be stat are rejected.
+
+    Will throw exception if the file type is not supported.
+
+    Arguments:
+        min_size : int
+
+        max_size : int
+
+        newer_than : float
+
+        older_than : float
+
+        file_type : str
+
+    Returns:
+        function
+    """
+
+    if file_type is not None and file_type not in FILE_TYPES:
+        raise Exception("Invalid file type: {0}".format(file_type))
+
+    check_stat = (
+        min_size is not None
+        or max_size is not None
+        or newer_than is not None
+        or older_than is not None
+    )
+
+    if not check_stat and file_type is None:
+        return None
+
+    def entry_filter(entry):
+        try:
+            if file_type is not None:
+                if entry.is_symlink():
+                    current_type = "link"
+                elif entry.is_file(follow_symlinks=False):
+                    current_type = "file"
+                else:
+                    current_type = "other"
+
+                if current_type != file_type:
+                    return False
+
+            if not check_stat:
+                return True
+
+            st = entry.stat()
+        except OSError:
+            return False
+
+        if min_size is not None and st.st_size < min_size:
+            return False
+
+        if max_size is not None and st.st_size > max_size:
+            return False
+
+        if newer_than is not None and st.st_mtime <= newer_than:
+            return False
+
+        if older_than is not None and st.st_mtime >= older_than:
+            return False
+
+        return True
+
+    return entry_filter
+
+
+# -----------------------------------------------------------------------------
+class PatternMatcher(object):
+    """
+    Match names against a list of fnmatch patterns compiled once.
+
+    Literal patterns are checked with a set, patterns like "*.o" and "build*" are
+    checked with str.endswith and str.startswith and all the other patterns are
+    combined into one regular expression. Names are matched like fnmatch.fnmatch,
+    including the case normalization of the current platform.
+
+    Arguments:
+        pattern : str | list[str] | PatternMatcher
+    """
+
+    def __init__(self, pattern):
+        if isinstance(pattern, str):
+            pattern = [pattern]
+
+        self.patterns = list(pattern)
+        self.normcase = os.path.normcase("A/B") != "A/B"
+        self.match_all = False
+        self.literals = set()
+        self.prefixes = []
+        self.suffixes = []
+
+        regex_list = []
+
+        for pattern_item in self.patterns:
+            if self.normcase:
+                pattern_item = os.path.normcase(pattern_item)
+
+            if pattern_item == "*":
+                self.match_all = True
+            elif not _has_magic(pattern_item):
+                self.literals.add(pattern_item)
+            elif pattern_item.startswith("*") and not _has_magic(pattern_item[1:]):
+                self.suffixes.append(pattern_item[1:])
+            elif pattern_item.endswith("*") and not _has_magic(pattern_item[:-1]):
+                self.prefixes.append(pattern_item[:-1])
+            else:
+                regex_list.append(fnmatch.translate(pattern_item))
+
+        self.prefixes = tuple(self.prefixes)
+        self.suffixes = tuple(self.suffixes)
+        self.regex = None
+
+        if regex_list:
+            self.regex = re.compile("|".join("(?:%s)" % x for x in regex_list))
+
+    def match(self, name):
+        """
+        Check if a name match any of the patterns.
+
+        Arguments:
+            name : str
+
+        Returns:
+            bool
+        """
+
+        if self.match_all:
+            return True
+
+        if self.normcase:
+            name = os.path.normcase(name)
+
+        if name in self.literals:
+            return True
+
+        if self.suffixes and name.endswith(self.suffixes):
+            return True
+
+        if self.prefixes and name.startswith(self.prefixes):
+            return True
+
+        if self.regex is not None and self.regex.match(name):
+            return True
+
+        return False
+
+
+# -----------------------------------------------------------------------------
+def compile_pattern(pattern):
+    """
+    Get a pattern matcher for a pattern or a list of patterns.
+
+    Compiled matchers are cached, and a matcher is returned as is, so it can be
+    passed to all functions that accept a pattern.
+
+    Arguments:
+        pattern : str | list[str] | PatternMatcher
+
+    Returns:
+        PatternMatcher
+    """
+
+    if isinstance(pattern, PatternMatcher):
+        return pattern
+
+    if isinstance(pattern, str):
+        return _compile_pattern_list((pattern,))
+
+    return _compile_pattern_list(tuple(pattern))
+
+
+# -----------------------------------------------------------------------------
+@functools.lru_cache(maxsize=128)
+def _compile_pattern_list(pattern_list):
+    """
+    Compile and cache a pattern matcher for a tuple of patterns.
+
+    Arguments:
+        pattern_list : tuple[str]
+
+    Returns:
+        PatternMatcher
+    """
+
+    return PatternMatcher(pattern_list)
+
+
+# -----------------------------------------------------------------------------
+def _has_magic(pattern):
+    """
+    Check if a pattern has any fnmatch special character.
+
+    Arguments:
+        pattern : str
+
+    Returns:
+        bool
+    """
+
+    return "*" in pattern or "?" in pattern or "[" in pattern
+
+
+# -----------------------------------------------------------------------------
+class PathPatternMatcher(object):
+    """
+    Match relative paths against a list of gitignore style patterns compiled once.
+
+    Patterns without a slash match the entry name at any depth, like "node_modules" or "*.pyc".
+    Patterns with a slash are anchored to the walked directory, like "/build" or "src/gen",
+    and "**" matches any number of directories, like "**/cache" or "docs/**/*.tmp".
+    Patterns ending with a slash only match directories. Paths use "/" as separator.
+
+    Arguments:
+        pattern : str | list[str] | PathPatternMatcher
+    """
+
+    def __init__(self, pattern):
+        if isinstance(pattern, str):
+            pattern = [pattern]
+
+        self.patterns = list(pattern)
+
+        flags = re.IGNORECASE if os.path.normcase("A") != "A" else 0
+        regex_list = []
+        dir_regex_list = []
+
+        for pattern_item in self.patterns:
+            dir_only = pattern_item.endswith("/")
+            regex = _translate_path_pattern(pattern_item.rstrip("/"))
+
+            if dir_only:
+                dir_regex_list.append(regex)
+            else:
+                regex_list.append(regex)
+
+        self.regex = None
+        self.dir_regex = None
+
+        if regex_list:
+            self.regex = re.compile("|".join(regex_list), flags)
+
+        if dir_regex_list:
+            self.dir_regex = re.compile("|".join(dir_regex_list), flags)
+
+    def match(self, path, is_dir=False):
+        """
+        Check if a relative path match any of the patterns.
+
+        Arguments:
+            path : str
+
+            is_dir : bool
+
+        Returns:
+            bool
+        """
+
+        if self.regex is not None and self.regex.fullmatch(path):
+            return True
+
+        if is_dir and self.dir_regex is not None and self.dir_regex.fullmatch(path):
+            return True
+
+        return False
+
+
+# -----------------------------------------------------------------------------
+def compile_path_pattern(pattern):
+    """
+    Get a path pattern matcher for a gitignore style pattern or a list of patterns.
+
+    Compiled matchers are cached, a matcher is returned as is and None is returned
+    for empty patterns, so it can be passed to all functions that accept exclude patterns.
+
+    Arguments:
+        pattern : str | list[str] | PathPatternMatcher
+
+    Returns:
+        PathPatternMatcher
+    """
+
+    if not pattern:
+        return None
+
+    if isinstance(pattern, PathPatternMatcher):
+        return pattern
+
+    if isinstance(pattern, str):
+        return _compile_path_pattern_list((pattern,))
+
+    return _compile_path_pattern_list(tuple(pattern))
+
+
+# -----------------------------------------------------------------------------
+@functools.lru_cache(maxsize=128)
+def _compile_path_pattern_list(pattern_list):
+    """
+    Compile and cache a path pattern matcher for a tuple of patterns.
+
+    Arguments:
+        pattern_list : tuple[str]
+
+    Returns:
+        PathPatternMatcher
+    """
+
+    return PathPatternMatcher(pattern_list)
+
+
+# -----------------------------------------------------------------------------
+def _translate_path_pattern(pattern):
+    """
+    Translate a gitignore style pattern, without the trailing slash, to a regular expression.
+
+    Arguments:
+        pattern : str
+
+    Returns:
+        str
+    """
+
+    anchored = "/" in pattern
+    segments = pattern.lstrip("/").split("/")
+    regex = "" if anchored else "(?:.*/)?"
+
+    for position, segment in enumerate(segments):
+        last = position == len(segments) - 1
+
+        if segment == "**":
+            regex += ".*" if last else "(?:[^/]*/)*"
+            continue
+
+        regex += _translate_path_segment(segment)
+
+        if not last:
+            regex += "/"
+
+    return "(?:%s)" % regex
+
+
+# -----------------------------------------------------------------------------
+def _translate_path_segment(segment):
+    """
+    Translate a fnmatch pattern of one path segment to a regular expression that never match a slash.
+
+    Arguments:
+        segment : str
+
+    Returns:
+        str
+    """
+
+    regex = ""
+    position = 0
+
+    while position < len(segment):
+        char = segment[position]
+        position += 1
+
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = segment.find("]", position + 1)
+
+            if end < 0:
+                regex += "\\["
+                continue
+
+            chars = segment[position:end].replace("\\", "\\\\")
+            position = end + 1
+
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+            elif chars.startswith("^"):
+                chars = "\\" + chars
+
+            regex += "[%s]" % chars
+        else:
+            regex += re.escape(char)
+
+    return regex
+
+
+# -----------------------------------------------------------------------------
+def current_dir():
+    """
+    Get current directory with path normalized.
+
+    Arguments:
+        None
+
+    Returns:
+        str
+    """
+
+    return normalize_path(os.getcwd())
+
+
+# -----------------------------------------------------------------------------
+def normalize_path(path):
+    """
+    Get path normalized to unix pattern.
+
+    Arguments:
+        path : str
+
+    Returns:
+        str
+    """
+
+    if path:
+        path = path.replace("\\", "/")
+        return path
+    else:
+        return ""
+
+
+# -----------------------------------------------------------------------------
+def create_dir(path):
+    """
+    Create directory and all intermediate ones with all errors ignored.
+
+    Arguments:
+        path : str
+
+    Returns:
+        None
+    """
+
+    if path:
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+
+
+# -----------------------------------------------------------------------------
+def set_file_content(file_path, content, method="w", if_changed=False):
+    """
+    Set file content creating directory and file, if not exists.
+
+    The file can be kept untouched when it already has the same content using
+    if_changed parameter, comparing the size first and then the bytes, and in this
+    case the new content is written to a temporary file that replaces the file.
+
+    Arguments:
+        file_path : str
+
+        contents : str
+
+        method : str
+
+        if_changed : bool
+
+    Returns:
+        bool
+    """
+
+    file_dir = os.path.dirname(file_path)
+
+    if if_changed and method in ["w", "wb"]:
+        create_dir(file_dir)
+
+        if method == "w":
+            buffer = io.BytesIO()
+
+            with io.TextIOWrapper(buffer, write_through=True) as f:
+                f.write(content)
+                content = buffer.getvalue()
+
+        return _write_file_if_changed(file_path, content)
+
+    remove_file(file_path)
+    create_dir(file_dir)
+
+    with open(file_path, method) as f:
+        f.write(content)
+        f.close()
+
+    _invalidate_content_cache(file_path)
+
+    return True
+
+
+# -----------------------------------------------------------------------------
+def get_file_contents(file_path, method="r"):
+    """
+    Get file contents.
+
+    When the content cache is enabled the contents are cached while the file doesn't change.
+
+    Arguments:
+        file_path : str
+
+        method : str
+
+    Returns:
+        str
+    """
+
+    return _read_file_cached(file_path, method)
+
+
+# -----------------------------------------------------------------------------
+def enable_content_cache(max_bytes=64 * 1024 * 1024):
+    """
+    Enable the cache of file contents used by get_file_contents and file_has_content.
+
+    Contents are cached by path and are valid while the size, modification time and inode
+    of the file are the same. Files changed by this module are removed from the cache and
+    the least recently used contents are removed when the cache size is bigger than max_bytes.
+
+    Arguments:
+        max_bytes : int
+
+    Returns:
+        None
+    """
+
+    global _content_cache_max_bytes
+
+    with _content_cache_lock:
+        _content_cache_max_bytes = max_bytes
+        _evict_content_cache()
+
+
+# -----------------------------------------------------------------------------
+def disable_content_cache():
+    """
+    Disable the cache of file contents and remove all cached contents.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+
+    enable_content_cache(0)
+
+
+# -----------------------------------------------------------------------------
+def clear_content_cache():
+    """
+    Remove all cached file contents and reset the statistics.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+
+    global _content_cache_bytes
+
+    with _content_cache_lock:
+        _content_cache.clear()
+        _content_cache_bytes = 0
+
+        for key in _content_cache_stats:
+            _content_cache_stats[key] = 0
+
+
+# -----------------------------------------------------------------------------
+def get_content_cache_stats():
+    """
+    Get the statistics of the file contents cache.
+
+    Arguments:
+        None
+
+    Returns:
+        dict
+    """
+
+    with _content_cache_lock:
+        stats = dict(_content_cache_stats)
+        stats["entries"] = len(_content_cache)
+        stats["bytes"] = _content_cache_bytes
+        stats["max_bytes"] = _content_cache_max_bytes
+
+    return stats
+
+
+# -----------------------------------------------------------------------------
+def _read_file_cached(file, method="r", encoding=None):
+    """
+    Read a file using the content cache when it is enabled.
+
+    Arguments:
+        file : str
+
+        method : str
+
+        encoding : str
+
+    Returns:
+        str | bytes
+    """
+
+    if _content_cache_max_bytes <= 0:
+        with open(file, method, encoding=encoding) as f:
+            return f.read()
+
+    key = os.path.abspath(file)
+
+    with open(file, method, encoding=encoding) as f:
+        st = os.fstat(f.fileno())
+        signature = (st.st_size, st.st_mtime_ns, st.st_ino, method, encoding)
+
+        with _content_cache_lock:
+            cached = _content_cache.get(key)
+
+            if cached is not None and cached[0] == signature:
+                _content_cache.move_to_end(key)
+                _content_cache_stats["hits"] += 1
+                return cached[1]
+
+            _content_cache_stats["misses"] += 1
+
+        contents = f.read()
+
+    _store_content_cache(key, signature, contents, st.st_size)
+
+    return contents
+
+
+# -----------------------------------------------------------------------------
+def _store_content_cache(key, signature, contents, size):
+    """
+    Store file contents in the cache when it fits, removing the least recently used ones.
+
+    Arguments:
+        key : str
+
+        signature : tuple
+
+        contents : str | bytes
+
+        size : int
+
+    Returns:
+        None
+    """
+
+    global _content_cache_bytes
+
+    with _content_cache_lock:
+        if size > _content_cache_max_bytes:
+            return
+
+        cached = _content_cache.pop(key, None)
+
+        if cached is not None:
+            _content_cache_bytes -= cached[2]
+
+        _content_cache[key] = (signature, contents, size)
+        _content_cache_bytes += size
+
+        _evict_content_cache()
+
+
+# -----------------------------------------------------------------------------
+def _evict_content_cache():
+    """
+    Remove the least recently used contents until the cache fits in the maximum size.
+
+    The cache lock must be held by the caller.
+
+    Arguments:
+        None
+
+    Returns:
+        None
+    """
+
+    global _content_cache_bytes
+
+    while _content_cache and _content_cache_bytes > _content_cache_max_bytes:
+        _, cached = _content_cache.popitem(last=False)
+        _content_cache_bytes -= cached[2]
+        _content_cache_stats["evictions"] += 1
+
+
+# -----------------------------------------------------------------------------
+def _invalidate_content_cache(file):
+    """
+    Remove a file from the content cache after it is changed.
+
+    Arguments:
+        file : str
+
+    Returns:
+        None
+    """
+
+    global _content_cache_bytes
+
+    if not _content_cache:
+        return
+
+    with _content_cache_lock:
+        cached = _content_cache.pop(os.path.abspath(file), None)
+
+        if cached is not None:
+            _content_cache_bytes -= cached[2]
+            _content_cache_stats["invalidations"] += 1
+
+
+# -----------------------------------------------------------------------------
+def copy_file(from_path, to_path):
+    """
+    Copy file from one path to other, creating the target directory if not exists.
+
+    Arguments:
+        from_path : str
+
+        to_path : str
+
+    Returns:
+        None
+    """
+
+    create_dir(os.path.dirname(to_path))
+    shutil.copyfile(from_path, to_path)
+
+
+# -----------------------------------------------------------------------------
+def copy_files(source_path, target_path, pattern, symlinks=True, link_mode="copy"):
+    """
+    Copy files inside source path to target path which match the pattern, creating the target directory if not exists.
+
+    Symbolic links can be copied too.
+
+    Files can be hard linked or cloned (reflink) instead of copied using link_mode parameter
+    with "hardlink", "reflink" or "auto" values, falling back to a copy when the filesystem
+    does not allow it.
+
+    Arguments:
+        source_path : str
+
+        target_path : str
+
+        pattern : str | list[str] | PatternMatcher
+
+        symlinks : bool
+
+        link_mode : str
+
+    Returns:
+        None
+    """
+
+    matcher = compile_pattern(pattern)
+
+    for entry in _walk_entries(source_path, files=True):
+        if matcher.match(entry.name):
+            create_dir(target_path)
+            _copy_file_data(
+                entry.path,
+                os.path.join(target_path, entry.name),
+                link_mode,
+                follow_symlinks=symlinks,
+            )
+
+
+# -----------------------------------------------------------------------------
+def copy_all(src_path, dst_path, workers=1):
+    """
+    Copy all files and directories inside source path to target path, creating the target directory if not exists.
+
+    File copies can run in parallel using workers parameter.
+
+    Arguments:
+        source_path : str
+
+        target_path : str
+
+        workers : int
+
+    Returns:
+        None
+    """
+
+    create_dir(dst_path)
+
+    jobs = []
+    dirs = []
+
+    for item in os.listdir(src_path):
+        src_item = os.path.join(src_path, item)
+        dst_item = os.path.join(dst_path, item)
+
+        if os.path.isdir(src_item):
+            _copy_all_tree(src_item, dst_item, jobs, dirs)
+        else:
+            jobs.append((src_item, dst_item))
+
+    _run_copy_jobs(jobs, workers)
+
+    # stats are restored after the files are copied and children first,
+    # so read-only directories and modification times are kept
+    for src_dir, dst_dir in reversed(dirs):
+        shutil.copystat(src_dir, dst_dir)
+
+
+# -----------------------------------------------------------------------------
+def _copy_all_tree(src, dst, jobs, dirs):
+    """
+    Create the directory tree and symbolic links of copy_all and add the files to be copied to the jobs list.
+
+    Directories are added to dirs list parents first, so their stats can be copied later.
+
+    Arguments:
+        src : str
+
+        dst : str
+
+        jobs : list[tuple[str, str]]
+
+        dirs : list[tuple[str, str]]
+
+    Returns:
+        None
+    """
+
+    os.makedirs(dst, exist_ok=True)
+    dirs.append((src, dst))
+
+    with os.scandir(src) as scanner:
+        entries = list(scanner)
+
+    for entry in entries:
+        dst_item = os.path.join(dst, entry.name)
+
+        if entry.is_symlink():
+            os.symlink(os.readlink(entry.path), dst_item)
+            shutil.copystat(entry.path, dst_item, follow_symlinks=False)
+        elif entry.is_dir():
+            _copy_all_tree(entry.path, dst_item, jobs, dirs)
+        else:
+            jobs.append((entry.path, dst_item))
+
+
+# -----------------------------------------------------------------------------
+def home_dir():
+    """
+    Get the user home directory.
+
+    Arguments:
+        None
+
+    Returns:
+        str
+    """
+
+    return os.path.expanduser("~")
+
+
+# -----------------------------------------------------------------------------
+def file_exists(path):
+    """
+    Check and return if a file exists or not.
+
+    Arguments:
+        path : str
+
+    Returns:
+        bool
+    """
+
+    if os.path.exists(path) and os.path.isfile(path):
+        return True
+
+    return False
+
+
+# -----------------------------------------------------------------------------
+def dir_exists(path):
+    """
+    Check and return if a directory exists or not.
+
+    Arguments:
+        path : str
+
+    Returns:
+        bool
+    """
+
+    if os.path.exists(path) and os.path.isdir(path):
+        return True
+
+    return False
+
+
+# -----------------------------------------------------------------------------
+def recreate_dir(path, background=False):
+    """
+    Remove directory and create a new one.
+
+    On background mode the directory is renamed to a hidden trash directory beside it,
+    the new directory is created right away and the trash is removed in a background thread.
+    Trash left by previous runs for the same directory is removed in background too.
+    Use wait_pending_removals function to wait for the removals.
+
+    Arguments:
+        path : str
+
+        background : bool
+
+    Returns:
+        None
+    """
+
+    if background:
+        trash_path = _move_to_trash(path)
+
+        if trash_path is not None:
+            _remove_dir_background(trash_path)
+
+    remove_dir(path)
+    create_dir(path)
+
+    if background:
+        remove_stale_trash(path, background=True)
+
+
+# -----------------------------------------------------------------------------
+def remove_stale_trash(path, background=False):
+    """
+    Remove the trash directories of a directory left by previous background removals and return them.
+
+    Trash directories being removed by the current process are ignored.
+
+    Arguments:
+        path : str
+
+        background : bool
+
+    Returns:
+        list[str]
+    """
+
+    parent_path, prefix = _get_trash_prefix(path)
+
+    try:
+        names = os.listdir(parent_path or os.curdir)
+    except OSError:
+        return []
+
+    with _pending_removals_lock:
+        pending = set(_pending_removals)
+
+    stale_list = []
+
+    for name in sorted(names):
+        trash_path = os.path.join(parent_path, name)
+
+        if name.startswith(prefix) and trash_path not in pending:
+            stale_list.append(trash_path)
+
+            if background:
+                _remove_dir_background(trash_path)
+            else:
+                remove_dir(trash_path)
+
+    return stale_list
+
+
+# -----------------------------------------------------------------------------
+def get_pending_removals():
+    """
+    Get the trash directories still being removed in background.
+
+    Arguments:
+        None
+
+    Returns:
+        list[str]
+    """
+
+    with _pending_removals_lock:
+        return sorted(
+            path for path, thread in _pending_removals.items() if thread.is_alive()
+        )
+
+
+# -----------------------------------------------------------------------------
+def wait_pending_removals(timeout=None):
+    """
+    Wait for the background removals and return if all of them have finished.
+
+    Arguments:
+        timeout : float
+
+    Returns:
+        bool
+    """
+
+    with _pending_removals_lock:
+        threads = list(_pending_removals.values())
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    for thread in threads:
+        if deadline is None:
+            thread.join()
+        else:
+            thread.join(max(0, deadline - time.monotonic()))
+
+    return not get_pending_removals()
+
+
+# -----------------------------------------------------------------------------
+def _move_to_trash(path):
+    """
+    Rename a directory to a new hidden trash directory beside it and return the trash path.
+
+    None is returned when the directory does not exists or cannot be renamed.
+
+    Arguments:
+        path : str
+
+    Returns:
+        str
+    """
+
+    if not os.path.isdir(path) or os.path.islink(path):
+        return None
+
+    parent_path, prefix = _get_trash_prefix(path)
+    trash_path = os.path.join(parent_path, prefix + uuid.uuid4().hex[:12])
+
+    try:
+        os.rename(path, trash_path)
+    except OSError:
+        return None
+
+    return trash_path
+
+
+# -----------------------------------------------------------------------------
+def _get_trash_prefix(path):
+    """
+    Get the parent directory and the name prefix of the trash directories of a directory.
+
+    Arguments:
+        path : str
+
+    Returns:
+        tuple[str, str]
+    """
+
+    parent_path, name = os.path.split(os.path.normpath(path))
+
+    return parent_path, "." + name + TRASH_DIR_SUFFIX
+
+
+# -----------------------------------------------------------------------------
+def _remove_dir_background(path):
+    """
+    Remove a directory in a background thread, tracking it as a pending removal.
+
+    Daemon threads are used, so exiting is not delayed and trash not removed
+    is found later as stale trash.
+
+    Arguments:
+        path : str
+
+    Returns:
+        None
+    """
+
+    def remove():
+        remove_dir(path)
+
+        with _pending_removals_lock:
+            if _pending_removals.get(path) is thread:
+                del _pending_removals[path]
+
+    thread = threading.Thread(target=remove, name="remove-dir", daemon=True)
+
+    with _pending_removals_lock:
+        _pending_removals[path] = thread
+
+    thread.start()
+
+
+# -----------------------------------------------------------------------------
+def copy_dir(
+    src,
+    dst,
+    symlinks=False,
+    ignore=None,
+    ignore_file=None,
+    workers=1,
+    sync=False,
+    checksum=False,
+    delete=False,
+    link_mode="copy",
+):
+    """
+    Copy a directory from one path to other.
+
+    Symbolic links can be copied too.
+
+    A function can be used in ignore parameter to check if files from a directory will be ignored or not.
+
+    A function can be used in ignore_file parameter to check if individual files will be ignored or not.
+
+    File copies can run in parallel using workers parameter.
+
+    On sync mode files are skipped when the target already has the same size and modification time,
+    or the same content when checksum parameter is enabled.
+
+    Files and directories that only exists on target can be deleted using delete parameter.
+
+    Files can be hard linked or cloned (reflink) instead of copied using link_mode parameter
+    with "hardlink", "reflink" or "auto" values, falling back to a copy when the filesystem
+    does not allow it.
+
+    Arguments:
+        src : str
+
+        dst : str
+
+        symlinks : bool
+
+        ignore: function
+
+        ignore_file: function
+
+        workers : int
+
+        sync : bool
+
+        checksum : bool
+
+        delete : bool
+
+        link_mode : str
+
+    Returns:
+        dict
+    """
+
+    jobs = []
+    summary = {"copied": [], "skipped": [], "deleted": []}
+
+    _copy_dir_tree(src, dst, symlinks, ignore, ignore_file, jobs, sync, delete, summary)
+
+    skip = None
+
+    if sync:
+        skip = functools.partial(_file_is_synced, checksum=checksum)
+
+    copied, skipped = _run_copy_jobs(
+        jobs, workers, ignore_errors=True, skip=skip, link_mode=link_mode
+    )
+
+    summary["copied"].extend(copied)
+    summary["skipped"].extend(skipped)
+
+    return summary
+
+
+# -----------------------------------------------------------------------------
+def _copy_dir_tree(
+    src,
+    dst,
+    symlinks,
+    ignore,
+    ignore_file,
+    jobs,
+    sync=False,
+    delete=False,
+    summary=None,
+):
+    """
+    Create the directory tree and symbolic links of copy_dir and add the files to be copied to the jobs list.
+
+    Symbolic links already pointing to the same path are kept on sync mode and
+    target entries that not exists on source are removed with delete parameter.
+
+    Arguments:
+        src : str
+
+        dst : str
+
+        symlinks : bool
+
+        ignore: function
+
+        ignore_file: function
+
+        jobs : list[tuple[str, str]]
+
+        sync : bool
+
+        delete : bool
+
+        summary : dict
+
+    Returns:
+        None
+    """
 
     if not os.path.exists(dst):
         os.makedirs(dst)
         shutil.copystat(src, dst)
 
-    lst = os.listdir(src)
+    names = os.listdir(src)
+    lst = names
+
+    if ignore:
+        excl = ignore(src, lst)
+        lst = [x for x in lst if x not in excl]
+
+    for item in lst:
+        s = os.path.join(src, item)
+        d = os.path.join(dst, item)
+
+        can_copy = True
+
+        if os.path.islink(s):
+            if symlinks:
+                if ignore_file is None:
+                    ignored_file = False
+                else:
+                    ignored_file = ignore_file(s)
+
+                if not ignored_file:
+                    link_target = os.readlink(s)
+
+                    if sync and os.path.islink(d) and os.readlink(d) == link_target:
+                        if summary is not None:
+                            summary["skipped"].append(d)
+                    else:
+                        if os.path.lexists(d):
+                            os.remove(d)
+
+                        os.symlink(link_target, d)
+
+                        if hasattr(os, "lchmod"):
+                            st = os.lstat(s)
+                            mode = stat.S_IMODE(st.st_mode)
+                            os.lchmod(d, mode)
+
+                        if summary is not None:
+                            summary["copied"].append(d)
+            else:
+                # ignore this symlink
+                can_copy = False
+        elif os.path.isdir(s):
+            _copy_dir_tree(
+                s, d, symlinks, ignore, ignore_file, jobs, sync, delete, summary
+            )
+            can_copy = False
+
+        if can_copy:
+            if ignore_file is None:
+                ignored_file = False
+            else:
+                ignored_file = ignore_file(s)
+
+            if not ignored_file:
+                jobs.append((s, d))
+
+    if delete:
+        names = set(names)
+
+        for item in os.listdir(dst):
+            if item not in names:
+                d = os.path.join(dst, item)
+
+                if os.path.isdir(d) and not os.path.islink(d):
+                    remove_dir(d)
+                else:
+                    os.remove(d)
+
+                if summary is not None:
+                    summary["deleted"].append(d)
+
+
+# -----------------------------------------------------------------------------
+def _run_copy_jobs(jobs, workers=1, ignore_errors=False, skip=None, link_mode="copy"):
+    """
+    Copy a list of files with its metadata, using a thread pool when there are more than one worker.
+
+    A function can be used in skip parameter to check if a file is already copied.
+
+    Arguments:
+        jobs : list[tuple[str, str]]
+
+        workers : int
+
+        ignore_errors : bool
+
+        skip : function
+
+        link_mode : str
+
+    Returns:
+        tuple[list[str], list[str]]
+    """
+
+    def copy_job(job):
+        try:
+            if skip is not None and skip(job[0], job[1]):
+                return False
+
+            _copy_file_with_stat(job[0], job[1], link_mode)
+        except IOError:
+            if not ignore_errors:
+                raise
+
+            return None
+
+        return True
+
+    if workers > 1 and len(jobs) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(copy_job, jobs))
+    else:
+        results = [copy_job(job) for job in jobs]
+
+    copied = [job[1] for job, result in zip(jobs, results) if result is True]
+    skipped = [job[1] for job, result in zip(jobs, results) if result is False]
+
+    return copied, skipped
+
+
+# -----------------------------------------------------------------------------
+def _file_is_synced(src, dst, checksum=False):
+    """
+    Check if target file has the same size and modification time of source file, or the same content using checksum parameter.
+
+    Arguments:
+        src : str
+
+        dst : str
+
+        checksum : bool
+
+    Returns:
+        bool
+    """
+
+    try:
+        src_stat = os.stat(src)
+        dst_stat = os.stat(dst)
+    except OSError:
+        return False
+
+    if os.path.samestat(src_stat, dst_stat):
+        return True
+
+    if not stat.S_ISREG(dst_stat.st_mode) or src_stat.st_size != dst_stat.st_size:
+        return False
+
+    if checksum:
+        return filecmp.cmp(src, dst, shallow=False)
+
+    return src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+
+
+# -----------------------------------------------------------------------------
+def _copy_file_with_stat(src, dst, link_mode="copy"):
+    """
+    Copy file data and metadata like shutil.copy2, letting the kernel copy the data when possible.
+
+    Arguments:
+        src : str
+
+        dst : str
+
+        link_mode : str
+
+    Returns:
+        None
+    """
+
+    if _copy_file_data(src, dst, link_mode) != "hardlink":
+        shutil.copystat(src, dst)
+
+
+# -----------------------------------------------------------------------------
+def _copy_file_data(src, dst, link_mode="copy", follow_symlinks=True):
+    """
+    Copy file data from source path to target path and return the method used.
+
+    The link_mode parameter can be "copy", "hardlink", "reflink" or "auto". Links are
+    only created when the filesystem allows it, otherwise the data is copied.
+
+    On Linux the data is copied inside the kernel with os.copy_file_range, falling
+    back to shutil.copyfile.
+
+    Arguments:
+        src : str
+
+        dst : str
+
+        link_mode : str
+
+        follow_symlinks : bool
+
+    Returns:
+        str
+    """
+
+    if link_mode not in LINK_MODES:
+        raise Exception("Link mode not supported: {0}".format(link_mode))
+
+    _invalidate_content_cache(dst)
+
+    if not follow_symlinks and os.path.islink(src):
+        shutil.copyfile(src, dst, follow_symlinks=False)
+        return "copy"
+
+    if link_mode in ["hardlink", "auto"] and _hardlink_file(src, dst):
+        return "hardlink"
+
+    # a target linked by a previous hardlink copy must not be changed in place
+    _unlink_shared_file(src, dst)
+
+    if fcntl is not None and sys.platform.startswith("linux") and _is_regular_file(src):
+        try:
+            with open(src, "rb") as fsrc:
+                # open target without truncate, same file is handled by shutil.copyfile
+                dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT, 0o666)
+
+                with os.fdopen(dst_fd, "wb") as fdst:
+                    src_stat = os.fstat(fsrc.fileno())
+                    dst_stat = os.fstat(dst_fd)
+
+                    if not os.path.samestat(src_stat, dst_stat):
+                        fdst.truncate(0)
+
+                        if link_mode in ["reflink", "auto"]:
+                            if _reflink_fd(fsrc.fileno(), dst_fd):
+                                return "reflink"
+
+                        if _copy_file_range_fd(fsrc.fileno(), dst_fd):
+                            return "copy"
+        except OSError:
+            pass
+
+    shutil.copyfile(src, dst)
+
+    return "copy"
+
+
+# -----------------------------------------------------------------------------
+def _unlink_shared_file(src, dst):
+    """
+    Remove the target file when it has more than one hard link, so writing it does not change the other links.
+
+    Arguments:
+        src : str
+
+        dst : str
+
+    Returns:
+        None
+    """
+
+    try:
+        st = os.lstat(dst)
+
+        if not stat.S_ISREG(st.st_mode) or st.st_nlink < 2:
+            return
+
+        if os.path.realpath(src) == os.path.realpath(dst):
+            return
+
+        os.remove(dst)
+    except OSError:
+        pass
+
+
+# -----------------------------------------------------------------------------
+def _is_regular_file(path):
+    """
+    Check if a path is a regular file, following symbolic links and ignoring errors.
+
+    Special files like pipes and devices must not be opened to be copied.
+
+    Arguments:
+        path : str
+
+    Returns:
+        bool
+    """
+
+    try:
+        return stat.S_ISREG(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+# -----------------------------------------------------------------------------
+def _hardlink_file(src, dst):
+    """
+    Create a hard link from source path to target path, replacing the target file.
+
+    Arguments:
+        src : str
+
+        dst : str
+
+    Returns:
+        bool
+    """
+
+    try:
+        if os.path.lexists(dst):
+            if os.path.samefile(src, dst):
+                return True
+
+            os.remove(dst)
+
+        os.link(src, dst)
+    except OSError:
+        return False
+
+    return True
+
+
+# -----------------------------------------------------------------------------
+def _reflink_fd(src_fd, dst_fd):
+    """
+    Share the data of source file with target file using the FICLONE ioctl, for filesystems like btrfs and xfs.
+
+    Arguments:
+        src_fd : int
+
+        dst_fd : int
+
+    Returns:
+        bool
+    """
+
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError:
+        return False
+
+
+# -----------------------------------------------------------------------------
+def _copy_file_range_fd(src_fd, dst_fd):
+    """
+    Copy all data from source file to target file inside the kernel with os.copy_file_range.
+
+    Arguments:
+        src_fd : int
+
+        dst_fd : int
+
+    Returns:
+        bool
+    """
+
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    block_size = max(os.fstat(src_fd).st_size, 2**23)
+
+    try:
+        while os.copy_file_range(src_fd, dst_fd, block_size) > 0:
+            pass
+    except OSError:
+        return False
+
+    return True
+
+
+# -----------------------------------------------------------------------------
+def hash_file(file, algorithm="sha256"):
+    """
+    Hash the contents of a file and return the hex digest.
+
+    The file is read into a large buffer reused by the current thread.
+
+    Arguments:
+        file : str
+
+        algorithm : str
+
+    Returns:
+        str
+    """
+
+    return _hash_file_digest(file, algorithm).hex()
+
+
+# -----------------------------------------------------------------------------
+def hash_tree(
+    path,
+    pattern="*",
+    recursive=True,
+    follow_links=False,
+    ignore=None,
+    ignore_file=None,
+    algorithm="sha256",
+    workers=4,
+):
+    """
+    Hash a directory tree and return a deterministic Merkle hex digest.
+
+    Files are selected like find_files function and filtered with ignore and ignore_file
+    functions like copy_dir function. Each directory digest is built from the sorted names,
+    types and digests of its entries, so the digest only changes when a selected file content,
+    name or location changes. Directories without selected entries are not part of the digest.
+
+    Symbolic links are hashed by its target path, unless follow_links parameter is enabled.
+    Other file types, like named pipes, sockets and devices, are hashed by its type without
+    reading them.
+
+    File contents are hashed in parallel using workers parameter.
+
+    Arguments:
+        path : str
+
+        pattern : str | list[str] | PatternMatcher
+
+        recursive : bool
+
+        follow_links : bool
+
+        ignore : function
+
+        ignore_file : function
+
+        algorithm : str
+
+        workers : int
+
+    Returns:
+        str
+    """
+
+    matcher = compile_pattern(pattern)
+    files = []
+
+    node = _collect_hash_tree(
+        path, matcher, recursive, follow_links, ignore, ignore_file, files
+    )
+
+    def hash_one(file):
+        return _hash_file_digest(file, algorithm)
+
+    if workers > 1 and len(files) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            digests = list(executor.map(hash_one, files))
+    else:
+        digests = [hash_one(x) for x in files]
+
+    return _hash_tree_node(node, digests, algorithm).hex()
+
+
+# -----------------------------------------------------------------------------
+def _hash_file_digest(file, algorithm="sha256"):
+    """
+    Hash the contents of a file and return the digest bytes.
+
+    Arguments:
+        file : str
+
+        algorithm : str
+
+    Returns:
+        bytes
+    """
+
+    hasher = hashlib.new(algorithm)
+    buffer = getattr(_hash_buffers, "buffer", None)
+
+    if buffer is None:
+        buffer = bytearray(HASH_BUFFER_SIZE)
+        _hash_buffers.buffer = buffer
+
+    view = memoryview(buffer)
+
+    with open(file, "rb", buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+
+            if not size:
+                break
+
+            hasher.update(view[:size])
+
+    return hasher.digest()
+
+
+# -----------------------------------------------------------------------------
+def _collect_hash_tree(
+    path, matcher, recursive, follow_links, ignore, ignore_file, files
+):
+    """
+    Collect the sorted entries of a directory tree to be hashed, adding the selected files to files list.
+
+    Arguments:
+        path : str
+
+        matcher : PatternMatcher
+
+        recursive : bool
+
+        follow_links : bool
+
+        ignore : function
+
+        ignore_file : function
+
+        files : list[str]
+
+    Returns:
+        list[tuple[bytes, bytes, object]]
+    """
+
+    with os.scandir(path) as scanner:
+        entries = sorted(scanner, key=lambda x: os.fsencode(x.name))
+
+    if ignore:
+        excl = ignore(path, [x.name for x in entries])
+        entries = [x for x in entries if x.name not in excl]
+
+    node = []
+
+    for entry in entries:
+        name = os.fsencode(entry.name)
+
+        if entry.is_symlink() and (not follow_links or not os.path.exists(entry.path)):
+            if matcher.match(entry.name) and not (
+                ignore_file and ignore_file(entry.path)
+            ):
+                node.append((b"l", name, os.fsencode(os.readlink(entry.path))))
+        elif entry.is_dir():
+            if recursive:
+                child = _collect_hash_tree(
+                    entry.path,
+                    matcher,
+                    recursive,
+                    follow_links,
+                    ignore,
+                    ignore_file,
+                    files,
+                )
+
+                if child:
+                    node.append((b"d", name, child))
+        elif matcher.match(entry.name) and not (
+            ignore_file and ignore_file(entry.path)
+        ):
+            if entry.is_file():
+                files.append(entry.path)
+                node.append((b"f", name, len(files) - 1))
+            else:
+                # reading special files can block or never end
+                node.append((b"o", name, _get_special_file_type(entry)))
+
+    return node
+
+
+# -----------------------------------------------------------------------------
+def _get_special_file_type(entry):
+    """
+    Get a short name for the type of a special file, like a named pipe or socket.
+
+    Arguments:
+        entry : os.DirEntry
+
+    Returns:
+        bytes
+    """
+
+    try:
+        mode = entry.stat().st_mode
+    except OSError:
+        return b""
+
+    if stat.S_ISFIFO(mode):
+        return b"fifo"
+    elif stat.S_ISSOCK(mode):
+        return b"socket"
+    elif stat.S_ISCHR(mode):
+        return b"char"
+    elif stat.S_ISBLK(mode):
+        return b"block"
+
+    return b""
+
+
+# -----------------------------------------------------------------------------
+def _hash_tree_node(node, digests, algorithm="sha256"):
+    """
+    Build the digest of a directory node from the digests of its entries.
+
+    Arguments:
+        node : list[tuple[bytes, bytes, object]]
+
+        digests : list[bytes]
+
+        algorithm : str
+
+    Returns:
+        bytes
+    """
+
+    hasher = hashlib.new(algorithm)
+
+    for kind, name, value in node:
+        if kind == b"f":
+            digest = digests[value]
+        elif kind == b"d":
+            digest = _hash_tree_node(value, digests, algorithm)
+        else:
+            digest = hashlib.new(algorithm, value).digest()
+
+        hasher.update(kind + name + b"\0" + digest)
+
+    return hasher.digest()
+
+
+# -----------------------------------------------------------------------------
+def disk_usage(path, top=10, workers=4, follow_links=False, exclude=None):
+    """
+    Get the disk usage of a directory tree, with totals for each directory and the largest files.
+
+    The tree is walked like find_files function and the entries are stat in parallel using
+    workers parameter. Files with many hard links are counted once, in the directory of its
+    first path in sorted order, and the allocated size comes from the stat blocks, like du
+    command, when the platform has them. The size is the sum of the file sizes and the
+    allocated size includes the directories too.
+
+    Only the largest files are kept in a bounded heap, up to top parameter.
+
+    Returns None when the directory does not exists.
+
+    Arguments:
+        path : str
+
+        top : int
+
+        workers : int
+
+        follow_links : bool
+
+        exclude : str | list[str] | PathPatternMatcher
+
+    Returns:
+        dict
+    """
+
+    if not dir_exists(path):
+        return None
+
+    exclude = compile_path_pattern(exclude)
+    root_path = os.path.normpath(path)
+
+    entries = _walk_entries(
+        root_path, True, follow_links, files=True, dirs=True, exclude=exclude
+    )
+    chunks = iter(lambda: list(itertools.islice(entries, DISK_USAGE_CHUNK_SIZE)), [])
+
+    def stat_chunk(chunk):
+        stat_list = []
+
+        for entry in chunk:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=follow_links)
+                st = entry.stat(follow_symlinks=follow_links)
+
+                if not is_dir and not st.st_ino:
+                    # windows entries have no inode and links count
+                    st = os.stat(entry.path, follow_symlinks=follow_links)
+
+                stat_list.append((entry.path, is_dir, st))
+            except OSError:
+                pass
+
+        return stat_list
+
+    directories = {root_path: {"size": 0, "allocated": 0, "files": 0}}
+    largest = []
+    linked = {}
+
+    def add_entry(entry_path, is_dir, st):
+        if is_dir:
+            # the rollup adds the directory blocks to its parents
+            totals = directories.setdefault(
+                entry_path, {"size": 0, "allocated": 0, "files": 0}
+            )
+            totals["allocated"] += _get_allocated_size(st)
+            return
+
+        totals = directories.setdefault(
+            os.path.dirname(entry_path), {"size": 0, "allocated": 0, "files": 0}
+        )
+        totals["allocated"] += _get_allocated_size(st)
+        totals["size"] += st.st_size
+        totals["files"] += 1
+
+        item = (st.st_size, entry_path)
+
+        if len(largest) < top:
+            heapq.heappush(largest, item)
+        elif top > 0 and item > largest[0]:
+            heapq.heapreplace(largest, item)
+
+    directories[root_path]["allocated"] += _get_allocated_size(os.stat(root_path))
+
+    # stats are added as each chunk finish, so the entries are never all in memory
+    for stat_list in _map_chunks(stat_chunk, chunks, workers):
+        for entry_path, is_dir, st in stat_list:
+            if not is_dir and st.st_nlink > 1:
+                inode = (st.st_dev, st.st_ino)
+                current = linked.get(inode)
+
+                if current is None or entry_path < current[0]:
+                    linked[inode] = (entry_path, st)
+
+                continue
+
+            add_entry(entry_path, is_dir, st)
+
+    # files with many hard links are counted once in the first path, so the result
+    # doesn't depend on the order the chunks finish
+    for entry_path, st in linked.values():
+        add_entry(entry_path, False, st)
+
+    # add the totals of each directory to its parent, deepest first
+    for dir_path in sorted(directories, key=len, reverse=True):
+        if dir_path == root_path:
+            continue
+
+        totals = directories[dir_path]
+        parent = directories.setdefault(
+            os.path.dirname(dir_path), {"size": 0, "allocated": 0, "files": 0}
+        )
+
+        for key in totals:
+            parent[key] += totals[key]
+
+    root = directories[root_path]
+
+    return {
+        "path": root_path,
+        "size": root["size"],
+        "allocated": root["allocated"],
+        "files": root["files"],
+        "dirs": len(directories) - 1,
+        "directories": directories,
+        "largest": [(x[1], x[0]) for x in sorted(largest, reverse=True)],
+    }
+
+
+# -----------------------------------------------------------------------------
+def _map_chunks(function, chunks, workers=1):
+    """
+    Call a function for each chunk in a thread pool and yield the results as they finish.
+
+    Only a few chunks are submitted at the same time, so the chunks are consumed while
+    the results are used.
+
+    Arguments:
+        function : function
+
+        chunks : iterator[list]
+
+        workers : int
+
+    Returns:
+        iterator[object]
+    """
+
+    if workers <= 1:
+        for chunk in chunks:
+            yield function(chunk)
+
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+
+        for chunk in chunks:
+            if len(pending) >= workers * 2:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+
+                for future in done:
+                    yield future.result()
+
+            pending.add(executor.submit(function, chunk))
+
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+
+# -----------------------------------------------------------------------------
+def _get_allocated_size(st):
+    """
+    Get the allocated size of a stat result from its blocks, or its size when the platform has no blocks.
+
+    Arguments:
+        st : os.stat_result
+
+    Returns:
+        int
+    """
+
+    blocks = getattr(st, "st_blocks", None)
+
+    return st.st_size if blocks is None else blocks * 512
+
+
+# -----------------------------------------------------------------------------
+def show_disk_usage(usage, dirs=10):
+    """
+    Show the disk usage returned by disk_usage function with readable sizes.
+
+    The directories with the largest allocated sizes are shown, up to dirs parameter.
+
+    Arguments:
+        usage : dict
+
+        dirs : int
+
+    Returns:
+        None
+    """
+
+    if usage is None:
+        return
+
+    l.bold(
+        "Disk usage of {0}: {1} ({2} allocated) in {3} files and {4} directories".format(
+            usage["path"],
+            s.readable_file_size(usage["size"]),
+            s.readable_file_size(usage["allocated"]),
+            usage["files"],
+            usage["dirs"],
+        )
+    )
+
+    if usage["largest"]:
+        l.i("Largest files:")
+
+        for file_path, size in usage["largest"]:
+            l.bullet("{0}: {1}".format(file_path, s.readable_file_size(size)), l.YELLOW)
+
+    directories = sorted(
+        (
+            (totals["allocated"], dir_path)
+            for dir_path, totals in usage["directories"].items()
+            if dir_path != usage["path"]
+        ),
+        reverse=True,
+    )[:dirs]
+
+    if directories:
+        l.i("Largest directories:")
+
+        for allocated, dir_path in directories:
+            l.bullet(
+                "{0}: {1}".format(dir_path, s.readable_file_size(allocated)), l.YELLOW
+            )
+
+
+# -----------------------------------------------------------------------------
+def file_has_content(file, content, encoding="utf-8"):
+    """
+    Check and return if a file has a content inside.
+
+    When the content has no break lines and the encoding allows it, the encoded content is
+    searched in a memory mapped file, without decoding the file.
+
+    When the content cache is enabled the decoded contents are cached while the file doesn't change.
+
+    Arguments:
+        file : str
+
+        content : str
+
+    Returns:
+        bool
+    """
+
+    if _content_cache_max_bytes > 0:
+        return content in _read_file_cached(file, "r", encoding)
+
+    needle = _encode_search_content(content, encoding)
+
+    if needle is not None:
+        with _mmap_file(file) as mm:
+            if mm is not None:
+                return mm.find(needle) >= 0
+
+    with open(file, encoding=encoding) as f:
+        if content in f.read():
+            return True
+
+    return False
+
+
+# -----------------------------------------------------------------------------
+def files_have_content(files, content, encoding="utf-8", workers=4):
+    """
+    Check and return if each file of a list has a content inside, checking the files in parallel.
+
+    Arguments:
+        files : list[str]
+
+        content : str
+
+        workers : int
+
+    Returns:
+        dict
+    """
+
+    def check(file):
+        return file_has_content(file, content, encoding)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(files, executor.map(check, files)))
+
+
+# -----------------------------------------------------------------------------
+def prepend_to_file(file, content):
+    """
+    Add a content before current file content.
+
+    The current content is copied in chunks after the new content to a temporary file that replaces the file.
+
+    Arguments:
+        file : str
+
+        content : str
+
+    Returns:
+        None
+    """
+
+    with open(file) as f:
+        with _atomic_writer(file) as f_out:
+            f_out.write(content)
+            shutil.copyfileobj(f, f_out)
+
+
+# -----------------------------------------------------------------------------
+def append_to_file(file, content):
+    """
+    Add a content after current file content.
+
+    Arguments:
+        file : str
+
+        content : str
+
+    Returns:
+        None
+    """
+
+    with open(file, "a") as f:
+        f.write(content)
+
+    _invalidate_content_cache(file)
+
+
+# -----------------------------------------------------------------------------
+def append_contents_to_file(file, contents):
+    """
+    Add a list of contents after current file content, opening the file only once.
+
+    Arguments:
+        file : str
+
+        contents : iterable[str]
+
+    Returns:
+        None
+    """
+
+    with open(file, "a") as f:
+        f.writelines(contents)
+
+    _invalidate_content_cache(file)
+
+
+# -----------------------------------------------------------------------------
+def replace_in_file(
+    file, old_string, new_string, encoding="utf-8", if_changed=False, chunk_size=None
+):
+    """
+    Replace an old string by a new string inside a file.
+
+    The file can be kept untouched when the content doesn't change using if_changed
+    parameter, and in this case the new content is written to a temporary file that
+    replaces the file.
+
+    Files larger than memory can be changed reading chunks of chunk_size characters,
+    like replace_all_in_file.
+
+    Arguments:
+        file : str
+
+        old_string : str
+
+        new_string : str
+
+        if_changed : bool
+
+        chunk_size : int
+
+    Returns:
+        bool
+    """
+
+    if chunk_size:
+        if not old_string:
+            return _stream_insert_in_file(
+                file, new_string, encoding, chunk_size, if_changed
+            )
+
+        compiled = _compile_replacements({old_string: new_string})
+
+        return _stream_replace_all_in_file(
+            file, compiled, encoding, chunk_size, if_changed
+        )
+
+    with open(file, encoding=encoding) as f:
+        s = f.read()
+
+    if if_changed:
+        if old_string not in s or old_string == new_string:
+            return False
+
+        with _atomic_writer(file, encoding=encoding) as f:
+            f.write(s.replace(old_string, new_string))
+
+        return True
+
+    with open(file, "w", encoding=encoding) as f:
+        s = s.replace(old_string, new_string)
+        f.write(s)
+        f.close()
+
+    _invalidate_content_cache(file)
+
+    return True
+
+
+# -----------------------------------------------------------------------------
+def replace_all_in_file(file, replacements, encoding="utf-8", chunk_size=None):
+    """
+    Replace many old strings by new strings inside a file in only one pass.
+
+    All old strings are searched at the same time, so a replaced text is never replaced
+    again, and when two old strings start at the same position the longest one is used.
+
+    The file is only written, using a temporary file that replaces it, when the content changes.
+
+    Files larger than memory can be changed reading chunks of chunk_size characters, keeping
+    the end of each chunk to find the old strings that cross the chunk boundary.
+
+    Arguments:
+        file : str
+
+        replacements : dict
+
+        encoding : str
+
+        chunk_size : int
+
+    Returns:
+        bool
+    """
+
+    compiled = _compile_replacements(replacements)
+
+    if chunk_size:
+        return _stream_replace_all_in_file(file, compiled, encoding, chunk_size)
+
+    return _replace_all_in_file(file, compiled, encoding)
+
+
+# -----------------------------------------------------------------------------
+def replace_all_in_files(
+    path, replacements, pattern="*", recursive=False, encoding="utf-8", workers=4
+):
+    """
+    Replace many old strings by new strings inside many files, using a thread pool.
+
+    The path can be a list of files or a directory, where the files that match
+    the pattern are used. Each file is changed like replace_all_in_file.
+
+    Arguments:
+        path : str | list[str]
+
+        replacements : dict
+
+        pattern : str | list[str] | PatternMatcher
+
+        recursive : bool
+
+        encoding : str
+
+        workers : int
+
+    Returns:
+        list[str]
+    """
+
+    if isinstance(path, str):
+        files = find_files(path, pattern, recursive)
+    else:
+        files = list(path)
+
+    compiled = _compile_replacements(replacements)
+
+    def replace(file):
+        return _replace_all_in_file(file, compiled, encoding)
+
+    if workers > 1 and len(files) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(replace, files))
+    else:
+        results = [replace(file) for file in files]
+
+    return [file for file, changed in zip(files, results) if changed]
+
+
+# -----------------------------------------------------------------------------
+def _compile_replacements(replacements):
+    """
+    Compile a dict of replacements into one regular expression with the longest strings first.
+
+    Empty old strings are ignored and None is returned when there is nothing to replace.
+
+    Arguments:
+        replacements : dict
+
+    Returns:
+        tuple[re.Pattern, dict]
+    """
+
+    keys = sorted((x for x in replacements if x), key=len, reverse=True)
+
+    if not keys:
+        return None
+
+    regex = re.compile("|".join(re.escape(x) for x in keys))
+
+    return regex, dict(replacements)
+
+
+# -----------------------------------------------------------------------------
+def _replace_all_in_file(file, compiled, encoding="utf-8"):
+    """
+    Replace the compiled replacements inside a file, writing it only when it changes.
+
+    Arguments:
+        file : str
+
+        compiled : tuple[re.Pattern, dict]
+
+        encoding : str
+
+    Returns:
+        bool
+    """
+
+    if compiled is None:
+        return False
+
+    regex, replacements = compiled
+
+    with open(file, encoding=encoding) as f:
+        s = f.read()
+
+    new_s = regex.sub(lambda x: replacements[x.group(0)], s)
+
+    if new_s == s:
+        return False
+
+    with _atomic_writer(file, encoding=encoding) as f:
+        f.write(new_s)
+
+    return True
+
+
+# -----------------------------------------------------------------------------
+def _stream_replace_all_in_file(
+    file, compiled, encoding="utf-8", chunk_size=2**20, if_changed=True
+):
+    """
+    Replace the compiled replacements inside a file reading it in chunks.
+
+    The file is only written when it changes using if_changed parameter, otherwise
+    it is always written and True is returned, like replace_in_file.
+
+    Arguments:
+        file : str
+
+        compiled : tuple[re.Pattern, dict]
+
+        encoding : str
+
+        chunk_size : int
+
+        if_changed : bool
+
+    Returns:
+        bool
+    """
+
+    if compiled is None:
+        return False
+
+    regex, replacements = compiled
+    window = max(len(x) for x in replacements if x) - 1
+    changed = False
+
+    try:
+        with open(file, encoding=encoding) as f:
+            with _atomic_writer(file, encoding=encoding) as f_out:
+                buffer = ""
+
+                while True:
+                    chunk = f.read(chunk_size)
+                    buffer += chunk
+
+                    # matches starting before the window are complete
+                    safe = len(buffer) - window if chunk else len(buffer)
+                    position = 0
+
+                    for match in regex.finditer(buffer):
+                        if match.start() >= safe:
+                            break
+
+                        replacement = replacements[match.group(0)]
+
+                        if replacement != match.group(0):
+                            changed = True
+
+                        f_out.write(buffer[position : match.start()])
+                        f_out.write(replacement)
+                        position = match.end()
+
+                    if not chunk:
+                        f_out.write(buffer[position:])
+                        break
+
+                    if position < safe:
+                        f_out.write(buffer[position:safe])
+                        position = safe
+
+                    buffer = buffer[position:]
+
+                if not changed and if_changed:
+                    raise _FileNotChanged()
+    except _FileNotChanged:
+        return False
+
+    return True
+
+
+# -----------------------------------------------------------------------------
+def _stream_insert_in_file(
+    file, content, encoding="utf-8", chunk_size=2**20, if_changed=True
+):
+    """
+    Insert a content between all characters of a file reading it in chunks, like str.replace with an empty old string.
+
+    Arguments:
+        file : str
+
+        content : str
+
+        encoding : str
+
+        chunk_size : int
+
+        if_changed : bool
+
+    Returns:
+        bool
+    """
+
+    if if_changed and not content:
+        return False
+
+    with open(file, encoding=encoding) as f:
+        with _atomic_writer(file, encoding=encoding) as f_out:
+            f_out.write(content)
+
+            while True:
+                chunk = f.read(chunk_size)
+
+                if not chunk:
+                    break
+
+                f_out.write(chunk.replace("", content)[len(content) :])
+
+    return True
+
+
+# -----------------------------------------------------------------------------
+class _FileNotChanged(Exception):
+    """
+    Raised inside an atomic writer block to discard the temporary file.
+    """
+
+
+# -----------------------------------------------------------------------------
+def set_file_line_content(
+    file, line, content, new_line=False, encoding="utf-8", index=False
+):
+    """
+    Replace a line content inside a file by it number.
+
+    A break line can be added at the end using new_line parameter.
+
+    The file is read line by line and written to a temporary file that replaces it at the end.
+
+    A cached index with the offset of each line can be used with index parameter, and in
+    this case the line is changed in place when it keeps its length, otherwise the other
+    lines are copied in chunks to a temporary file that replaces it.
+
+    Arguments:
+        file : str
+
+        line : int
+
+        content : str
+
+        new_line: bool
+
+        index : bool
+
+    Returns:
+        None
+    """
+
+    if index and _is_byte_search_encoding(encoding):
+        data = (content + ("\n" if new_line else "")).replace("\n", os.linesep)
+        data = data.encode(encoding)
+
+        with open(file, "r+b") as f:
+            offsets = _get_file_line_offsets(file, f)
+
+            # files with lone carriage returns are changed line by line
+            if offsets is not None:
+                position = _get_line_offsets_index(offsets, line)
+                start, end = offsets[position]
+
+                if len(data) == end - start:
+                    f.seek(start)
+                    f.write(data)
+
+                    _update_file_line_offsets(file, f, offsets, position, data)
+                    _invalidate_content_cache(file)
+
+                    return
+
+                with _atomic_writer(file, "wb") as f_out:
+                    f.seek(0)
+                    remaining = start
+
+                    while remaining > 0:
+                        chunk = f.read(min(remaining, HASH_BUFFER_SIZE))
+
+                        if not chunk:
+                            break
+
+                        f_out.write(chunk)
+                        remaining -= len(chunk)
+
+                    f_out.write(data)
+                    f.seek(end)
+                    shutil.copyfileobj(f, f_out, HASH_BUFFER_SIZE)
+
+                    _update_file_line_offsets(file, f_out, offsets, position, data)
+
+                return
+
+    LineEdits(file, encoding=encoding).set(line, content, new_line).apply()
+
+
+# -----------------------------------------------------------------------------
+def get_file_line_contents(file, line, encoding="utf-8", index=False):
+    """
+    Get file line contents by it number.
+
+    The file is read line by line until the line is found.
+
+    A cached index with the offset of each line can be used with index parameter,
+    so the line is read directly from its position.
+
+    Arguments:
+        file : str
+
+        line : int
+
+        index : bool
+
+    Returns:
+        str
+    """
+
+    if index and _is_byte_search_encoding(encoding):
+        with open(file, "rb") as f:
+            offsets = _get_file_line_offsets(file, f)
+
+            # files with lone carriage returns are read line by line
+            if offsets is not None:
+                start, end = offsets[_get_line_offsets_index(offsets, line)]
+                f.seek(start)
+
+                return _decode_line(f.read(end - start), encoding)
+
+    with open(file, encoding=encoding) as f:
+        if line < 1:
+            # count from the end like a list index
+            lines = collections.deque(f, maxlen=1 - line)
+
+            if len(lines) < lines.maxlen:
+                raise IndexError("list index out of range")
+
+            return lines[0]
+
+        for line_contents in itertools.islice(f, line - 1, None):
+            return line_contents
+
+    raise IndexError("list index out of range")
+
+
+# -----------------------------------------------------------------------------
+def file_line_has_content(file, line, content, strip=False, index=False):
+    """
+    Check and return if a file line has a content by it number.
+
+    The line can be stripped before check with strip parameter.
+
+    A cached index with the offset of each line can be used with index parameter.
+
+    Arguments:
+        file : str
+
+        line : int
+
+        content : str
+
+        strip : bool
+
+        index : bool
+
+    Returns:
+        bool
+    """
+
+    line_contents = get_file_line_contents(file, line, index=index)
+
+    if strip:
+        return line_contents.strip() == content
+    else:
+        return line_contents == content
+
+
+# -----------------------------------------------------------------------------
+def prepend_to_file_line(file, line, content):
+    """
+    Add a content before a line content from file by it number.
+
+    Arguments:
+        file : str
+
+        line : int
+
+        content : str
+
+    Returns:
+        None
+    """
+
+    LineEdits(file).prepend(line, content).apply()
+
+
+# -----------------------------------------------------------------------------
+def prepend_to_file_line_range(file, line_start, line_end, content):
+    """
+    Add a content before a line content from a range of line numbers.
+
+    All lines are changed with only one read and one write of the file.
+
+    Arguments:
+        file : str
+
+        line_start : int
+
+        line_end : int
+
+        content : str
+
+    Returns:
+        None
+    """
+
+    edits = LineEdits(file)
+
+    for x in range(line_start, line_end + 1):
+        edits.prepend(x, content)
+
+    edits.apply()
+
+
+# -----------------------------------------------------------------------------
+class LineEdits(object):
+    """
+    Group many line edits of a file and apply them with only one read and one write.
+
+    Lines can be selected by it number or by a fnmatch pattern that is checked against
+    every line content without the break line. Line numbers always refer to the original
+    file, so inserted and deleted lines don't change the number of the other lines, and
+    numbers less than one count from the end like a list index.
+
+    Edits are applied in the order they were added and the file is replaced at once.
+    It can be used as a context manager to apply the edits at the end of the block.
+
+    Arguments:
+        file : str
+
+        encoding : str
+    """
+
+    def __init__(self, file, encoding="utf-8"):
+        self.file = file
+        self.encoding = encoding
+        self.edits = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.apply()
+
+    def set(self, line, content, new_line=False):
+        """
+        Replace the line content, including the break line.
+
+        A break line can be added at the end using new_line parameter.
+
+        Arguments:
+            line : int | str
+
+            content : str
+
+            new_line : bool
+
+        Returns:
+            LineEdits
+        """
+
+        return self._add(line, "set", content + ("\n" if new_line else ""))
+
+    def prepend(self, line, content):
+        """
+        Add a content before the line content.
+
+        Arguments:
+            line : int | str
+
+            content : str
+
+        Returns:
+            LineEdits
+        """
+
+        return self._add(line, "prepend", content)
+
+    def append(self, line, content):
+        """
+        Add a content after the line content, before the break line.
+
+        Arguments:
+            line : int | str
+
+            content : str
+
+        Returns:
+            LineEdits
+        """
+
+        return self._add(line, "append", content)
+
+    def insert(self, line, content):
+        """
+        Insert a new line before the line, adding a break line at the end of content if needed.
+
+        Arguments:
+            line : int | str
+
+            content : str
+
+        Returns:
+            LineEdits
+        """
+
+        if not content.endswith("\n"):
+            content += "\n"
+
+        return self._add(line, "insert", content)
+
+    def delete(self, line):
+        """
+        Delete the line.
+
+        Arguments:
+            line : int | str
+
+        Returns:
+            LineEdits
+        """
+
+        return self._add(line, "delete", None)
+
+    def apply(self):
+        """
+        Apply all edits and replace the file, clearing the edit list.
+
+        The file is not touched when there are no edits.
+
+        Will throw IndexError if a line number doesn't exists and the file is not changed.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+
+        if not self.edits:
+            return
+
+        line_edits = collections.defaultdict(list)
+        pattern_edits = []
+        line_count = None
+
+        for order, (line, action, content) in enumerate(self.edits):
+            if isinstance(line, str):
+                pattern_edits.append((order, compile_pattern(line), action, content))
+            else:
+                if line < 1 and line_count is None:
+                    line_count = _count_file_lines(self.file, self.encoding)
+
+                index = _get_file_line_index(self.file, line, self.encoding, line_count)
+                line_edits[index].append((order, action, content))
+
+        with open(self.file, encoding=self.encoding) as f:
+            with _atomic_writer(self.file, encoding=self.encoding) as f_out:
+                for index, line_contents in enumerate(f):
+                    edits = line_edits.pop(index, [])
+
+                    if pattern_edits:
+                        line_text = line_contents.rstrip("\r\n")
+
+                        for order, matcher, action, content in pattern_edits:
+                            if matcher.match(line_text):
+                                edits.append((order, action, content))
+
+                        edits.sort(key=lambda x: x[0])
+
+                    if edits:
+                        line_contents = self._apply_line(line_contents, edits)
+
+                    f_out.write(line_contents)
+
+                if line_edits:
+                    raise IndexError("list index out of range")
+
+        self.edits = []
+
+    def _add(self, line, action, content):
+        self.edits.append((line, action, content))
+        return self
+
+    def _apply_line(self, line_contents, edits):
+        inserted = []
+
+        for _, action, content in edits:
+            if action == "insert":
+                inserted.append(content)
+            elif line_contents is None:
+                # line was deleted
+                continue
+            elif action == "set":
+                line_contents = content
+            elif action == "prepend":
+                line_contents = content + line_contents
+            elif action == "append":
+                text = line_contents.rstrip("\r\n")
+                line_contents = text + content + line_contents[len(text) :]
+            elif action == "delete":
+                line_contents = None
+
+        return "".join(inserted) + (line_contents or "")
+
+
+# -----------------------------------------------------------------------------
+def get_file_line_number_with_content(
+    file, content, strip=False, match=False, encoding="utf-8"
+):
+    """
+    Get a file line number that has a content.
+
+    The lines can be stripped before check using strip parameter.
+
+    The fnmatch function can be used to check using match parameter.
+
+    Without match the content is searched in a memory mapped file when possible,
+    otherwise the file is read line by line.
+
+    Arguments:
+        file : str
+
+        content : str
+
+        strip : bool
+
+        match: bool
+
+    Returns:
+        int
+    """
+
+    if not match:
+        line_numbers = _search_file_lines(file, content, strip, encoding)
+
+        if line_numbers is not None:
+            try:
+                return next(line_numbers, None)
+            except _LoneCarriageReturn:
+                pass
+
+    with open(file, encoding=encoding) as f:
+        result = None
+
+        for line_number, line in enumerate(f):
+            if strip:
+                line = line.strip()
+
+            if match:
+                if fnmatch.fnmatch(line, content):
+                    result = line_number + 1
+                    break
+
+            else:
+                if line == content:
+                    result = line_number + 1
+                    break
+
+        f.close()
+
+        return result
+
+
+# -----------------------------------------------------------------------------
+def get_file_line_numbers_with_content(
+    file, content, strip=False, match=False, encoding="utf-8"
+):
+    """
+    Get a list of file line numbers that has a content.
+
+    The lines can be stripped before check using strip parameter.
+
+    The fnmatch function can be used to check using match parameter.
+
+    Without match the content is searched in a memory mapped file when possible,
+    otherwise the file is read line by line.
+
+    Arguments:
+        file : str
+
+        content : str
+
+        strip : bool
+
+        match: bool
+
+    Returns:
+        list[int]
+    """
+
+    if not match:
+        line_numbers = _search_file_lines(file, content, strip, encoding)
+
+        if line_numbers is not None:
+            try:
+                return list(line_numbers) or None
+            except _LoneCarriageReturn:
+                pass
+
+    with open(file, encoding=encoding) as f:
+        result = []
+
+        for line_number, line in enumerate(f):
+            if strip:
+                line = line.strip()
+
+            if match:
+                if fnmatch.fnmatch(line, content):
+                    result.append(line_number + 1)
+            else:
+                if line == content:
+                    result.append(line_number + 1)
+
+        f.close()
+
+        if len(result) > 0:
+            return result
+        else:
+            return None
+
+
+# -----------------------------------------------------------------------------
+def get_file_line_numbers_with_enclosing_tags(
+    file, start_tag, end_tag, start_from=1, encoding="utf-8"
+):
+    """
+    Get file line numbers that has start enclosing tag and end enclosing tags.
+
+    Using a simple parser algorithm this function search for the enclosing tags and return the start and end line numbers where it start and finish.
+
+    Arguments:
+        file : str
+
+        start_tag : str
+
+        end_tag : str
+
+        start_from : int
+
+    Returns:
+        list[int]
+    """
+
+    blocks = _iter_enclosing_tag_blocks(
+        file, start_tag, end_tag, start_from, encoding=encoding
+    )
+
+    return next(blocks, None)
+
+
+# -----------------------------------------------------------------------------
+def get_file_blocks_with_enclosing_tags(
+    file,
+    start_tag,
+    end_tag,
+    start_from=1,
+    nested=False,
+    quotes=None,
+    line_comments=None,
+    block_comments=None,
+    encoding="utf-8",
+):
+    """
+    Get the start and end line numbers of all blocks with enclosing tags in only one pass.
+
+    Tags can have more than one character. Only the outer blocks are returned, unless
+    nested parameter is enabled, and the search stops when an end tag has no start tag.
+
+    Tags inside strings and comments can be skipped using quotes parameter with the string
+    delimiters (like ['"', "'"]), line_comments parameter with the line comment starts (like
+    ["//"]) and block_comments parameter with the block comment delimiters (like [("/*", "*/")]).
+
+    Arguments:
+        file : str
+
+        start_tag : str
+
+        end_tag : str
+
+        start_from : int
+
+        nested : bool
+
+        quotes : list[str]
+
+        line_comments : list[str]
+
+        block_comments : list[tuple[str, str]]
+
+    Returns:
+        list[list[int]]
+    """
+
+    blocks = list(
+        _iter_enclosing_tag_blocks(
+            file,
+            start_tag,
+            end_tag,
+            start_from,
+            nested,
+            quotes,
+            line_comments,
+            block_comments,
+            encoding,
+        )
+    )
+
+    if nested:
+        blocks.sort()
+
+    return blocks
+
+
+# -----------------------------------------------------------------------------
+def _iter_enclosing_tag_blocks(
+    file,
+    start_tag,
+    end_tag,
+    start_from=1,
+    nested=False,
+    quotes=None,
+    line_comments=None,
+    block_comments=None,
+    encoding="utf-8",
+):
+    """
+    Scan a file line by line and yield the start and end line numbers of each block when it is closed.
+
+    All tokens are found with one regular expression, so lines are not checked character by character.
+
+    Arguments:
+        file : str
+
+        start_tag : str
+
+        end_tag : str
+
+        start_from : int
+
+        nested : bool
+
+        quotes : list[str]
+
+        line_comments : list[str]
+
+        block_comments : list[tuple[str, str]]
+
+        encoding : str
+
+    Returns:
+        iterator[list[int]]
+    """
+
+    tokens = {}
+    closing_tokens = {}
+
+    for quote in quotes or []:
+        tokens[quote] = "quote"
+        closing_tokens[quote] = re.compile(r"\\.|" + re.escape(quote), re.S)
+
+    for comment in line_comments or []:
+        tokens[comment] = "line_comment"
+
+    for comment_start, comment_end in block_comments or []:
+        tokens[comment_start] = "block_comment"
+        closing_tokens[comment_start] = comment_end
+
+    tokens[start_tag] = "start"
+    tokens[end_tag] = "end"
+
+    regex = re.compile(
+        "|".join(re.escape(x) for x in sorted(tokens, key=len, reverse=True))
+    )
+
+    stack = []
+    state = None
+    closing = None
+
+    with open(file, encoding=encoding) as f:
+        for line_number, line in enumerate(f, 1):
+            if line_number < start_from:
+                continue
+
+            position = 0
+
+            while True:
+                if state == "quote":
+                    match = closing.search(line, position)
+
+                    if not match:
+                        break
+
+                    position = match.end()
+
+                    if match.group(0)[0] != "\\":
+                        state = None
+
+                    continue
+
+                if state == "block_comment":
+                    index = line.find(closing, position)
+
+                    if index < 0:
+                        break
+
+                    position = index + len(closing)
+                    state = None
+
+                    continue
+
+                match = regex.search(line, position)
+
+                if not match:
+                    break
+
+                position = match.end()
+                token = match.group(0)
+                kind = tokens[token]
+
+                if kind == "start":
+                    stack.append(line_number)
+                elif kind == "end":
+                    if not stack:
+                        # end tag cannot come before start tag, stop
+                        return
+
+                    start_line = stack.pop()
+
+                    if nested or not stack:
+                        yield [start_line, line_number]
+                elif kind == "line_comment":
+                    break
+                else:
+                    state = kind
+                    closing = closing_tokens[token]
+
+
+# -----------------------------------------------------------------------------
+def _encode_search_content(content, encoding):
+    """
+    Encode a content to be searched in the file bytes.
+
+    None is returned when the bytes search can give a different result than
+    the decoded text search, like contents with break lines or encodings where
+    a character can be found inside another one.
+
+    Arguments:
+        content : str
+
+        encoding : str
+
+    Returns:
+        bytes
+    """
+
+    if not content or "\n" in content or "\r" in content:
+        return None
+
+    if not _is_byte_search_encoding(encoding):
+        return None
+
+    try:
+        return content.encode(encoding)
+    except UnicodeEncodeError:
+        return None
+
+
+# -----------------------------------------------------------------------------
+def _is_byte_search_encoding(encoding):
+    """
+    Check if an encoding allows to search text and break lines directly in the encoded bytes.
+
+    Arguments:
+        encoding : str
+
+    Returns:
+        bool
+    """
+
+    name = codecs.lookup(encoding).name
+
+    return name in BYTE_SEARCH_ENCODINGS or name.startswith("iso8859-")
+
+
+# -----------------------------------------------------------------------------
+class _LoneCarriageReturn(Exception):
+    """
+    Raised while searching a memory mapped file when a carriage return is not followed by a break line.
+    """
+
+
+# -----------------------------------------------------------------------------
+def _search_file_lines(file, content, strip=False, encoding="utf-8"):
+    """
+    Search a memory mapped file for lines equal to a content and return an iterator with the line numbers.
+
+    Only the lines where the content was found are decoded, and line numbers are
+    calculated counting the break lines before them. None is returned when the
+    content cannot be searched in the file bytes or when the file cannot be mapped.
+
+    The iterator raises _LoneCarriageReturn when the bytes read until a found line
+    have carriage returns that are not followed by a break line, since they are line
+    breaks for the text search and callers must use it instead.
+
+    Arguments:
+        file : str
+
+        content : str
+
+        strip : bool
+
+        encoding : str
 
-    if ignore:
-        excl = ignore(src, lst)
-        lst = [x for x in lst if x not in excl]
+    Returns:
+        iterator[int]
+    """
 
-    for item in lst:
-        s = os.path.join(src, item)
-        d = os.path.join(dst, item)
+    needle = content
 
-        can_copy = True
+    if not strip and needle.endswith("\n"):
+        needle = needle[:-1]
 
-        if os.path.islink(s):
-            if symlinks:
-                if ignore_file is None:
-                    ignored_file = False
-                else:
-                    ignored_file = ignore_file(s)
+    needle = _encode_search_content(needle, encoding)
 
-                if not ignored_file:
-                    if os.path.lexists(d):
-                        os.remove(d)
+    if needle is None:
+        return None
 
-                    os.symlink(os.readlink(s), d)
+    stack = contextlib.ExitStack()
+    mm = stack.enter_context(_mmap_file(file))
 
-                    if hasattr(os, "lchmod"):
-                        st = os.lstat(s)
-                        mode = stat.S_IMODE(st.st_mode)
-                        os.lchmod(d, mode)
-            else:
-                # ignore this symlink
-                can_copy = False
-        elif os.path.isdir(s):
-            copy_dir(s, d, symlinks, ignore, ignore_file)
-            can_copy = False
+    if mm is None:
+        stack.close()
+        return None
 
-        if can_copy:
-            if ignore_file is None:
-                ignored_file = False
-            else:
-                ignored_file = ignore_file(s)
+    def search():
+        with stack:
+            position = 0
+            line_number = 1
+            counted = 0
 
-            if not ignored_file:
-                try:
-                    shutil.copy2(s, d)
-                except IOError:
-                    pass
+            while True:
+                found = mm.find(needle, position)
+
+                if found < 0:
+                    return
+
+                line_start = mm.rfind(b"\n", 0, found) + 1
+                line_end = mm.find(b"\n", found)
+                line_end = len(mm) if line_end < 0 else line_end + 1
+
+                # only the bytes until the found line are checked, so the
+                # rest of the file is not read when the first line is enough
+                if _count_bytes(mm, b"\r", counted, line_end) != _count_bytes(
+                    mm, b"\r\n", counted, line_end
+                ):
+                    raise _LoneCarriageReturn()
+
+                line_number += _count_bytes(mm, b"\n", counted, line_start)
+                counted = line_start
+
+                line = mm[line_start:line_end]
+
+                if line.endswith(b"\r\n"):
+                    line = line[:-2] + b"\n"
+
+                line = line.decode(encoding)
+
+                if (line.strip() if strip else line) == content:
+                    yield line_number
+
+                position = line_end
+
+    return search()
 
 
 # -----------------------------------------------------------------------------
-def file_has_content(file, content, encoding="utf-8"):
+def _count_bytes(data, value, start, end, chunk_size=2**20):
     """
-    Check and return if a file has a content inside.
+    Count a byte sequence inside a range of a buffer in chunks, to not copy the whole range at once.
 
     Arguments:
-        file : str
+        data : mmap | bytes
 
-        content : str
+        value : bytes
+
+        start : int
+
+        end : int
+
+        chunk_size : int
 
     Returns:
-        bool
+        int
     """
 
-    with open(file, encoding=encoding) as f:
-        if content in f.read():
-            return True
+    count = 0
 
-    return False
+    while start < end:
+        chunk_end = min(end, start + chunk_size)
+        count += data[start:chunk_end].count(value)
+        start = chunk_end
+
+    return count
 
 
 # -----------------------------------------------------------------------------
-def prepend_to_file(file, content):
+@contextlib.contextmanager
+def _mmap_file(file):
     """
-    Add a content before current file content.
+    Map a file to memory for read, returning None when it cannot be mapped.
+
+    Files with size zero are not mapped too, since files like the ones in procfs
+    report size zero and still have contents, so callers must read them instead.
 
     Arguments:
         file : str
 
-        content : str
-
     Returns:
-        None
+        mmap
     """
 
-    file_content = content + get_file_contents(file)
-    file_dest = open(file, "w")
-    file_dest.write(file_content)
-    file_dest.close()
+    with open(file, "rb") as f:
+        try:
+            if os.fstat(f.fileno()).st_size == 0:
+                mm = None
+            else:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            mm = None
+
+        if mm is None:
+            yield None
+            return
+
+        try:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+
+            yield mm
+        finally:
+            mm.close()
 
 
 # -----------------------------------------------------------------------------
-def append_to_file(file, content):
+def clear_line_index_cache():
     """
-    Add a content after current file content.
+    Remove all cached line indexes used by line functions with index parameter.
 
     Arguments:
-        file : str
-
-        content : str
+        None
 
     Returns:
         None
     """
 
-    file_content = get_file_contents(file) + content
-    file_dest = open(file, "w")
-    file_dest.write(file_content)
-    file_dest.close()
+    with _line_index_lock:
+        _line_index_cache.clear()
 
 
 # -----------------------------------------------------------------------------
-def replace_in_file(file, old_string, new_string, encoding="utf-8"):
+class _LineOffsets(object):
     """
-    Replace an old string by a new string inside a file.
+    Byte offsets where each line of a file starts, stored in a compact array.
 
     Arguments:
-        file : str
+        starts : array
 
-        old_string : str
+        size : int
+    """
 
-        new_string : str
+    def __init__(self, starts, size):
+        self.starts = starts
+        self.size = size
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, position):
+        start = self.starts[position]
+
+        if position + 1 < len(self.starts):
+            return start, self.starts[position + 1]
+
+        return start, self.size
+
+
+# -----------------------------------------------------------------------------
+def _get_file_line_offsets(file, f):
+    """
+    Get the line offsets of an open binary file from the cache, building it when the file changed.
+
+    The cache key is the real path and it is valid while size, modification time and inode are the same.
+
+    None is returned when the file has carriage returns that are not followed by a break
+    line, since they are line breaks for the text functions.
+
+    Arguments:
+        file : str
+
+        f : file object
 
     Returns:
-        None
+        _LineOffsets | None
     """
 
-    with open(file, encoding=encoding) as f:
-        s = f.read()
+    key = os.path.realpath(file)
+    st = os.fstat(f.fileno())
+    signature = (st.st_size, st.st_mtime_ns, st.st_ino)
 
-    with open(file, "w", encoding=encoding) as f:
-        s = s.replace(old_string, new_string)
-        f.write(s)
-        f.close()
+    with _line_index_lock:
+        cached = _line_index_cache.get(key)
+
+        if cached is not None and cached[0] == signature:
+            _line_index_cache.move_to_end(key)
+            return cached[1]
+
+    f.seek(0)
+    starts = _build_line_starts(f)
+    offsets = None if starts is None else _LineOffsets(starts, st.st_size)
+
+    _store_file_line_offsets(key, signature, offsets)
+
+    return offsets
 
 
 # -----------------------------------------------------------------------------
-def set_file_line_content(file, line, content, new_line=False, encoding="utf-8"):
+def _update_file_line_offsets(file, f, offsets, position, data):
     """
-    Replace a line content inside a file by it number.
-
-    A break line can be added at the end using new_line parameter.
+    Update the cached line offsets after a line was replaced by new data in place.
 
     Arguments:
         file : str
 
-        line : int
+        f : file object
 
-        content : str
+        offsets : _LineOffsets
 
-        new_line: bool
+        position : int
+
+        data : bytes
 
     Returns:
         None
     """
 
-    with open(file, encoding=encoding) as f:
-        lines = f.readlines()
-        lines[line - 1] = content + ("\n" if new_line else "")
-        f.close()
+    f.flush()
+
+    if data.count(b"\r") != data.count(b"\r\n"):
+        # lone carriage returns are checked when the index is built again
+        return
+
+    st = os.fstat(f.fileno())
+    signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    start, end = offsets[position]
+    delta = len(data) - (end - start)
+
+    starts = offsets.starts[:position]
+    starts.append(start)
+
+    found = data.find(b"\n")
+
+    while 0 <= found < len(data) - 1:
+        starts.append(start + found + 1)
+        found = data.find(b"\n", found + 1)
 
-        with open(file, "w", encoding=encoding) as f:
-            f.writelines(lines)
-            f.close()
+    following = offsets.starts[position + 1 :]
+
+    if following and not data.endswith(b"\n"):
+        # new data without break line joins the next line
+        following = following[1:]
+
+    starts.extend(x + delta for x in following)
+
+    if starts and starts[-1] >= st.st_size:
+        starts.pop()
+
+    _store_file_line_offsets(
+        os.path.realpath(file), signature, _LineOffsets(starts, st.st_size)
+    )
 
 
 # -----------------------------------------------------------------------------
-def get_file_line_contents(file, line, encoding="utf-8"):
+def _store_file_line_offsets(key, signature, offsets):
     """
-    Get file line contents by it number.
+    Store line offsets in the cache, removing the least recently used ones.
 
     Arguments:
-        file : str
+        key : str
 
-        line : int
+        signature : tuple
+
+        offsets : _LineOffsets | None
 
     Returns:
-        str
+        None
     """
 
-    with open(file, encoding=encoding) as f:
-        lines = f.readlines()
-        contents = lines[line - 1]
-        f.close()
+    with _line_index_lock:
+        _line_index_cache[key] = (signature, offsets)
+        _line_index_cache.move_to_end(key)
 
-        return contents
+        while len(_line_index_cache) > LINE_INDEX_CACHE_SIZE:
+            _line_index_cache.popitem(last=False)
 
 
 # -----------------------------------------------------------------------------
-def file_line_has_content(file, line, content, strip=False):
+def _build_line_starts(f, chunk_size=2**20):
     """
-    Check and return if a file line has a content by it number.
+    Read a binary file in chunks and return the offsets where each line starts.
 
-    The line can be stripped before check with strip parameter.
+    None is returned when a carriage return is not followed by a break line.
 
     Arguments:
-        file : str
-
-        line : int
-
-        content : str
+        f : file object
 
-        strip : bool
+        chunk_size : int
 
     Returns:
-        bool
+        array | None
     """
 
-    line_contents = get_file_line_contents(file, line)
+    starts = array.array("q", [0])
+    position = 0
+    carriage_return = False
 
-    if strip:
-        return line_contents.strip() == content
-    else:
-        return line_contents == content
+    while True:
+        chunk = f.read(chunk_size)
+
+        if carriage_return and not chunk.startswith(b"\n"):
+            return None
+
+        if not chunk:
+            break
+
+        # a carriage return at the end is checked with the next chunk
+        carriage_return = chunk.endswith(b"\r")
+
+        if chunk.count(b"\r") - carriage_return != chunk.count(b"\r\n"):
+            return None
+
+        found = chunk.find(b"\n")
+
+        while found >= 0:
+            starts.append(position + found + 1)
+            found = chunk.find(b"\n", found + 1)
+
+        position += len(chunk)
+
+    # there is no line after the last break line
+    if starts[-1] == position:
+        starts.pop()
+
+    return starts
 
 
 # -----------------------------------------------------------------------------
-def prepend_to_file_line(file, line, content):
+def _get_line_offsets_index(offsets, line):
     """
-    Add a content before a line content from file by it number.
+    Get the position of a line number inside line offsets, counting from the end when it is less than one.
 
     Arguments:
-        file : str
+        offsets : _LineOffsets
 
         line : int
 
-        content : str
-
     Returns:
-        None
+        int
     """
 
-    line_contents = get_file_line_contents(file, line)
-    set_file_line_content(file, line, content + line_contents)
+    position = line - 1 if line >= 1 else len(offsets) + line - 1
+
+    if position < 0 or position >= len(offsets):
+        raise IndexError("list index out of range")
+
+    return position
 
 
 # -----------------------------------------------------------------------------
-def prepend_to_file_line_range(file, line_start, line_end, content):
+def _decode_line(data, encoding):
     """
-    Add a content before a line content from a range of line numbers.
+    Decode line bytes translating the break line like files opened in text mode.
 
     Arguments:
-        file : str
+        data : bytes
 
-        line_start : int
-
-        line_end : int
-
-        content : str
+        encoding : str
 
     Returns:
-        None
+        str
     """
 
-    for x in range(line_start, line_end + 1):
-        prepend_to_file_line(file, x, content)
+    if data.endswith(b"\r\n"):
+        data = data[:-2] + b"\n"
+
+    return data.decode(encoding)
 
 
 # -----------------------------------------------------------------------------
-def get_file_line_number_with_content(
-    file, content, strip=False, match=False, encoding="utf-8"
-):
+def _get_file_line_index(file, line, encoding="utf-8", line_count=None):
     """
-    Get a file line number that has a content.
-
-    The lines can be stripped before check using strip parameter.
+    Get the list index of a line number, counting from the end of the file when it is less than one.
 
-    The fnmatch function can be used to check using match parameter.
+    The number of lines is counted from the file when not passed in line_count parameter.
 
     Arguments:
         file : str
 
-        content : str
-
-        strip : bool
+        line : int
 
-        match: bool
+        line_count : int
 
     Returns:
         int
     """
 
-    with open(file, encoding=encoding) as f:
-        lines = f.readlines()
-
-        result = None
-
-        for line_number, line in enumerate(lines):
-            if strip:
-                line = line.strip()
+    if line >= 1:
+        return line - 1
 
-            if match:
-                if fnmatch.fnmatch(line, content):
-                    result = line_number + 1
-                    break
+    if line_count is None:
+        line_count = _count_file_lines(file, encoding)
 
-            else:
-                if line == content:
-                    result = line_number + 1
-                    break
+    index = line_count + line - 1
 
-        f.close()
+    if index < 0:
+        raise IndexError("list index out of range")
 
-        return result
+    return index
 
 
 # -----------------------------------------------------------------------------
-def get_file_line_numbers_with_content(
-    file, content, strip=False, match=False, encoding="utf-8"
-):
+def _count_file_lines(file, encoding="utf-8"):
     """
-    Get a list of file line numbers that has a content.
-
-    The lines can be stripped before check using strip parameter.
-
-    The fnmatch function can be used to check using match parameter.
+    Count the lines of a file.
 
     Arguments:
         file : str
 
-        content : str
-
-        strip : bool
-
-        match: bool
+        encoding : str
 
     Returns:
-        list[int]
+        int
     """
 
     with open(file, encoding=encoding) as f:
-        lines = f.readlines()
+        return sum(1 for _ in f)
 
-        result = []
 
-        for line_number, line in enumerate(lines):
-            if strip:
-                line = line.strip()
+# -----------------------------------------------------------------------------
+def _write_file_if_changed(file, data):
+    """
+    Write bytes to a file only when they are different from the current file bytes.
 
-            if match:
-                if fnmatch.fnmatch(line, content):
-                    result.append(line_number + 1)
-            else:
-                if line == content:
-                    result.append(line_number + 1)
+    The size is compared first and the file is replaced using a temporary file.
 
-        f.close()
+    Arguments:
+        file : str
 
-        if len(result) > 0:
-            return result
-        else:
-            return None
+        data : bytes
+
+    Returns:
+        bool
+    """
+
+    try:
+        if os.stat(file).st_size == len(data):
+            with open(file, "rb") as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+
+    with _atomic_writer(file, "wb") as f:
+        f.write(data)
+
+    return True
 
 
 # -----------------------------------------------------------------------------
-def get_file_line_numbers_with_enclosing_tags(
-    file, start_tag, end_tag, start_from=1, encoding="utf-8"
-):
+@contextlib.contextmanager
+def _atomic_writer(file, mode="w", encoding=None):
     """
-    Get file line numbers that has start enclosing tag and end enclosing tags.
+    Open a temporary file in the same directory of a file that replaces it when the block finish without errors.
 
-    Using a simple parser algorithm this function search for the enclosing tags and return the start and end line numbers where it start and finish.
+    The permissions of the current file are kept and symbolic links are resolved,
+    so the link target is replaced.
 
     Arguments:
         file : str
 
-        start_tag : str
-
-        end_tag : str
+        mode : str
 
-        start_from : int
+        encoding : str
 
     Returns:
-        list[int]
+        file object
     """
 
-    with open(file, encoding=encoding) as f:
-        lines = f.readlines()
+    path = file
+    file = os.path.realpath(file)
 
-        result = None
-        start_tag_count = 0
-        end_tag_count = 0
-        finish = False
-        start_line_found = 0
-        end_line_found = 0
-
-        for line_number, line in enumerate(lines):
-            if (line_number + 1) >= start_from:
-                for line_char in line:
-                    if line_char == start_tag:  # start tag
-                        start_tag_count += 1
-
-                        if start_line_found == 0:
-                            # store first line with start tag
-                            start_line_found = line_number + 1
-                    elif line_char == end_tag:  # end tag
-                        if start_line_found == 0:
-                            # end tag cannot come before start tag, stop
-                            finish = True
-
-                        end_tag_count += 1
-
-                    if start_line_found > 0:  # initialization
-                        if start_tag_count == end_tag_count:  # count match
-                            # the numbers of found tags was initialized and match
-                            finish = True
-
-                            end_line_found = line_number + 1
-                            result = [start_line_found, end_line_found]
+    fd, temp_path = tempfile.mkstemp(
+        prefix=".{0}.".format(os.path.basename(file)),
+        suffix=".tmp",
+        dir=os.path.dirname(file),
+    )
 
-                            break
+    try:
+        with open(fd, mode, encoding=encoding) as f:
+            yield f
 
-            if finish:
-                break
+        if not os.path.exists(file):
+            # create the file to get the default permissions
+            os.close(os.open(file, os.O_WRONLY | os.O_CREAT, 0o666))
 
-        f.close()
+        shutil.copymode(file, temp_path)
+        os.replace(temp_path, file)
 
-        return result
+        _invalidate_content_cache(path)
+        _invalidate_content_cache(file)
+    except BaseException:
+        remove_file(temp_path)
+        raise
 
 
 # -----------------------------------------------------------------------------
@@ -0,0 +1,631 @@
+import array
+import json
+import os
+import stat
+import time
+
+import pygemstones.io.file as f
+
+# entry flags
+ENTRY_DIR = 1
+ENTRY_LINK = 2
+ENTRY_FILE = 4
+
+# version of saved index files
+INDEX_VERSION = 2
+
+# directories changed less than this time before the scan are rescanned on refresh
+RACY_INTERVAL_NS = 2 * 10**9
+
+
+# -----------------------------------------------------------------------------
+class DirRecord(object):
+    """
+    Entries of one indexed directory, stored in compact arrays.
+
+    Arguments:
+        mtime : int
+
+        names : list[str]
+
+        flags : bytearray
+
+        sizes : array
+
+        mtimes : array
+    """
+
+    def __init__(self, mtime, names, flags, sizes, mtimes):
+        self.mtime = mtime
+        self.names = names
+        self.flags = flags
+        self.sizes = sizes
+        self.mtimes = mtimes
+
+    def subdirs(self, follow_links=False):
+        """
+        Get the names of the sub directories that are indexed.
+
+        Arguments:
+            follow_links : bool
+
+        Returns:
+            list[str]
+        """
+
+        return [
+            name
+            for name, flag in zip(self.names, self.flags)
+            if flag & ENTRY_DIR and (follow_links or not flag & ENTRY_LINK)
+        ]
+
+
+# -----------------------------------------------------------------------------
+class DirIndex(object):
+    """
+    Index of a directory tree that answer find_files and find_dirs queries from memory.
+
+    The tree is walked once storing the type, size and modification time of each entry.
+    The refresh method only rescan the directories with a different modification time, so
+    added, removed and renamed entries are found without walking the whole tree again.
+
+    Arguments:
+        path : str
+
+        follow_links : bool
+    """
+
+    def __init__(self, path, follow_links=False):
+        self.path = path
+        self.follow_links = follow_links
+        self.dirs = {}
+
+    def build(self):
+        """
+        Walk the whole directory tree and index all entries.
+
+        Arguments:
+            None
+
+        Returns:
+            DirIndex
+        """
+
+        self.dirs = {}
+
+        if f.dir_exists(self.path):
+            self._scan_tree("")
+
+        return self
+
+    def refresh(self):
+        """
+        Rescan the directories with a different modification time and return how many were rescanned.
+
+        Arguments:
+            None
+
+        Returns:
+            int
+        """
+
+        rescanned = 0
+
+        for rel_path in sorted(self.dirs):
+            record = self.dirs.get(rel_path)
+
+            if record is None:
+                # removed with the parent directory
+                continue
+
+            try:
+                mtime = os.stat(self._full_path(rel_path)).st_mtime_ns
+            except OSError:
+                self._remove_tree(rel_path)
+                continue
+
+            if mtime == record.mtime:
+                continue
+
+            new_subdirs = self._rescan_dir(rel_path)
+            rescanned += 1
+
+            for sub_path in new_subdirs or []:
+                self._scan_tree(sub_path)
+
+        if not self.dirs and f.dir_exists(self.path):
+            self._scan_tree("")
+            rescanned += 1
+
+        return rescanned
+
+    def rescan(self, path=None):
+        """
+        Rescan a directory and all its sub directories, replacing its indexed entries.
+
+        Arguments:
+            path : str
+
+        Returns:
+            None
+        """
+
+        rel_path = self._rel_path(path)
+
+        self._remove_tree(rel_path)
+        self._scan_tree(rel_path)
+
+    def rescan_dir(self, path=None):
+        """
+        Rescan only the entries of a directory, keeping its indexed sub directories.
+
+        Sub directories that not exist anymore are removed from the index, and the new
+        ones are returned without its entries, use rescan method to index them. None is
+        returned when the directory not exists anymore.
+
+        Arguments:
+            path : str
+
+        Returns:
+            list[str] | None
+        """
+
+        new_subdirs = self._rescan_dir(self._rel_path(path))
+
+        if new_subdirs is None:
+            return None
+
+        return [self._full_path(x) for x in new_subdirs]
+
+    def remove_tree(self, path=None):
+        """
+        Remove a directory and all its sub directories from the index, without touching the disk.
+
+        Arguments:
+            path : str
+
+        Returns:
+            None
+        """
+
+        self._remove_tree(self._rel_path(path))
+
+    def full_path(self, rel_path):
+        """
+        Get the full path of a path relative to the indexed directory.
+
+        Arguments:
+            rel_path : str
+
+        Returns:
+            str
+        """
+
+        return self._full_path(rel_path)
+
+    def update_entry(self, path):
+        """
+        Update the indexed type, size and modification time of a single entry.
+
+        The entry is removed from the index if it not exists anymore, together with all
+        indexed entries below it. New directories are added without its entries, use
+        rescan method to index them.
+
+        Arguments:
+            path : str
+
+        Returns:
+            int
+        """
+
+        rel_dir, name = os.path.split(self._rel_path(path))
+        record = self.dirs.get(rel_dir)
+
+        if record is None or not name:
+            return 0
+
+        info = _stat_entry(path)
+
+        try:
+            position = record.names.index(name)
+        except ValueError:
+            position = -1
+
+        if info is None or not info[0] & ENTRY_DIR:
+            self._remove_tree(os.path.join(rel_dir, name))
+
+        if info is None:
+            if position >= 0:
+                del record.names[position]
+                del record.flags[position]
+                del record.sizes[position]
+                del record.mtimes[position]
+
+            return 0
+
+        flag, size, mtime = info
+
+        if position >= 0:
+            record.flags[position] = flag
+            record.sizes[position] = size
+            record.mtimes[position] = mtime
+        else:
+            record.names.append(name)
+            record.flags.append(flag)
+            record.sizes.append(size)
+            record.mtimes.append(mtime)
+
+        return flag
+
+    def find_files(self, pattern, recursive=False, path=None):
+        """
+        Find all indexed files which match the pattern, like find_files function.
+
+        The search can start in a sub directory using path parameter and results are sorted.
+
+        Arguments:
+            pattern : str | list[str] | PatternMatcher
+
+            recursive : bool
+
+            path : str
+
+        Returns:
+            list[str]
+        """
+
+        return sorted(x[0] for x in self._find(pattern, recursive, path, files=True))
+
+    def find_dirs(self, pattern, recursive=False, path=None):
+        """
+        Find all indexed directories which match the pattern, like find_dirs function.
+
+        The search can start in a sub directory using path parameter and results are sorted.
+
+        Arguments:
+            pattern : str | list[str] | PatternMatcher
+
+            recursive : bool
+
+            path : str
+
+        Returns:
+            list[str]
+        """
+
+        return sorted(x[0] for x in self._find(pattern, recursive, path, dirs=True))
+
+    def entries(self, recursive=True, path=None):
+        """
+        Iterate over all indexed entries with it path, flags, size and modification time.
+
+        Directories are iterated in sorted order and the entries of each one are sorted by name.
+
+        Arguments:
+            recursive : bool
+
+            path : str
+
+        Returns:
+            iterator[tuple[str, int, int, int]]
+        """
+
+        return self._find("*", recursive, path, files=True, dirs=True)
+
+    def save(self, file):
+        """
+        Save the index to a JSON file, to be loaded by other runs.
+
+        Arguments:
+            file : str
+
+        Returns:
+            None
+        """
+
+        data = {
+            "version": INDEX_VERSION,
+            "path": self.path,
+            "follow_links": self.follow_links,
+            "dirs": {
+                rel_path: [
+                    record.mtime,
+                    record.names,
+                    list(record.flags),
+                    record.sizes.tolist(),
+                    record.mtimes.tolist(),
+                ]
+                for rel_path, record in self.dirs.items()
+            },
+        }
+
+        f.create_dir(os.path.dirname(file))
+
+        with open(file, "w", encoding="utf-8") as index_file:
+            json.dump(data, index_file, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, file):
+        """
+        Load an index saved by save method.
+
+        The file is treated as a cache, so None is returned when it not exists, can't
+        be decoded or was saved by other index version, and the index must be built again.
+
+        Arguments:
+            file : str
+
+        Returns:
+            DirIndex | None
+        """
+
+        try:
+            with open(file, encoding="utf-8") as index_file:
+                data = json.load(index_file)
+
+            if data["version"] != INDEX_VERSION:
+                return None
+
+            index = cls(data["path"], data["follow_links"])
+
+            for rel_path, (mtime, names, flags, sizes, mtimes) in data["dirs"].items():
+                if not len(names) == len(flags) == len(sizes) == len(mtimes):
+                    return None
+
+                index.dirs[rel_path] = DirRecord(
+                    mtime,
+                    names,
+                    bytearray(flags),
+                    array.array("q", sizes),
+                    array.array("q", mtimes),
+                )
+        except (OSError, ValueError, KeyError, TypeError, OverflowError):
+            return None
+
+        return index
+
+    def _find(self, pattern, recursive, path=None, files=False, dirs=False):
+        """
+        Iterate over the indexed entries which match the pattern, with it path, flags, size and modification time.
+
+        Arguments:
+            pattern : str | list[str] | PatternMatcher
+
+            recursive : bool
+
+            path : str
+
+            files : bool
+
+            dirs : bool
+
+        Returns:
+            iterator[tuple[str, int, int, int]]
+        """
+
+        matcher = f.compile_pattern(pattern)
+        base = self._rel_path(path)
+
+        if recursive:
+            prefix = base + os.sep if base else ""
+            rel_paths = sorted(
+                x for x in self.dirs if x == base or x.startswith(prefix)
+            )
+        else:
+            rel_paths = [base] if base in self.dirs else []
+
+        for rel_path in rel_paths:
+            record = self.dirs[rel_path]
+            names = record.names
+
+            for position in sorted(range(len(names)), key=names.__getitem__):
+                name = names[position]
+                flag = record.flags[position]
+
+                if flag & ENTRY_DIR:
+                    if not dirs:
+                        continue
+                elif not files or not (recursive or flag & ENTRY_FILE):
+                    continue
+
+                if matcher.match(name):
+                    yield (
+                        self._full_path(os.path.join(rel_path, name)),
+                        flag,
+                        record.sizes[position],
+                        record.mtimes[position],
+                    )
+
+    def _scan_tree(self, rel_path):
+        """
+        Scan a directory and all its sub directories, replacing their records.
+
+        Arguments:
+            rel_path : str
+
+        Returns:
+            None
+        """
+
+        pending = [rel_path]
+
+        while pending:
+            current = pending.pop()
+            record = self._scan_dir(current)
+
+            if record is not None:
+                for name in record.subdirs(self.follow_links):
+                    pending.append(os.path.join(current, name))
+
+    def _rescan_dir(self, rel_path):
+        """
+        Scan a directory again, removing the sub directories that not exist anymore and returning the new ones.
+
+        Arguments:
+            rel_path : str
+
+        Returns:
+            list[str] | None
+        """
+
+        record = self.dirs.get(rel_path)
+        old_subdirs = set(record.subdirs(self.follow_links)) if record else set()
+        new_record = self._scan_dir(rel_path)
+
+        if new_record is None:
+            self._remove_tree(rel_path)
+            return None
+
+        new_subdirs = set(new_record.subdirs(self.follow_links))
+
+        for name in old_subdirs - new_subdirs:
+            self._remove_tree(os.path.join(rel_path, name))
+
+        return [
+            os.path.join(rel_path, name)
+            for name in sorted(new_subdirs)
+            if os.path.join(rel_path, name) not in self.dirs
+        ]
+
+    def _scan_dir(self, rel_path):
+        """
+        Scan the entries of a single directory and store its record, or remove it when it cannot be scanned.
+
+        Arguments:
+            rel_path : str
+
+        Returns:
+            DirRecord | None
+        """
+
+        full_path = self._full_path(rel_path)
+        scan_time = time.time_ns()
+
+        try:
+            mtime = os.stat(full_path).st_mtime_ns
+
+            with os.scandir(full_path) as scanner:
+                entries = list(scanner)
+        except OSError:
+            self.dirs.pop(rel_path, None)
+            return None
+
+        if mtime + RACY_INTERVAL_NS > scan_time:
+            # entries can change in the same time unit, check again on refresh
+            mtime = -1
+
+        names = []
+        flags = bytearray()
+        sizes = array.array("q")
+        mtimes = array.array("q")
+
+        for entry in entries:
+            flag = 0
+
+            try:
+                if entry.is_dir():
+                    flag |= ENTRY_DIR
+                elif entry.is_file():
+                    flag |= ENTRY_FILE
+
+                if entry.is_symlink():
+                    flag |= ENTRY_LINK
+
+                st = entry.stat()
+                size = st.st_size
+                entry_mtime = st.st_mtime_ns
+            except OSError:
+                size = 0
+                entry_mtime = 0
+
+            names.append(entry.name)
+            flags.append(flag)
+            sizes.append(size)
+            mtimes.append(entry_mtime)
+
+        record = DirRecord(mtime, names, flags, sizes, mtimes)
+        self.dirs[rel_path] = record
+
+        return record
+
+    def _remove_tree(self, rel_path):
+        """
+        Remove the records of a directory and all its sub directories.
+
+        Arguments:
+            rel_path : str
+
+        Returns:
+            None
+        """
+
+        prefix = rel_path + os.sep if rel_path else ""
+
+        for x in [x for x in self.dirs if x == rel_path or x.startswith(prefix)]:
+            del self.dirs[x]
+
+    def _full_path(self, rel_path):
+        """
+        Get the full path of a path relative to the indexed directory.
+
+        Arguments:
+            rel_path : str
+
+        Returns:
+            str
+        """
+
+        return os.path.join(self.path, rel_path) if rel_path else self.path
+
+    def _rel_path(self, path):
+        """
+        Get the path relative to the indexed directory, where an empty string is the indexed directory.
+
+        Arguments:
+            path : str
+
+        Returns:
+            str
+        """
+
+        if not path or path == self.path:
+            return ""
+
+        rel_path = os.path.relpath(path, self.path)
+
+        return "" if rel_path == os.curdir else rel_path
+
+
+# -----------------------------------------------------------------------------
+def _stat_entry(path):
+    """
+    Get the flags, size and modification time of a path, or None when it not exists.
+
+    Arguments:
+        path : str
+
+    Returns:
+        tuple[int, int, int] | None
+    """
+
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+
+    flag = 0
+
+    if stat.S_ISLNK(st.st_mode):
+        flag |= ENTRY_LINK
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            return (flag, 0, 0)
+
+    if stat.S_ISDIR(st.st_mode):
+        flag |= ENTRY_DIR
+    elif stat.S_ISREG(st.st_mode):
+        flag |= ENTRY_FILE
+
+    return (flag, st.st_size, st.st_mtime_ns)
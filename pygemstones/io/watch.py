@@ -0,0 +1,495 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+
+import pygemstones.io.index as idx
+import pygemstones.system.platform as p
+
+# inotify flags
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_ONLYDIR
+)
+
+# change feed events
+EVENT_CREATED = "created"
+EVENT_DELETED = "deleted"
+EVENT_MODIFIED = "modified"
+EVENT_MOVED_FROM = "moved_from"
+EVENT_MOVED_TO = "moved_to"
+EVENT_OVERFLOW = "overflow"
+
+EVENT_HEADER = struct.Struct("iIII")
+EVENT_BUFFER_SIZE = 64 * 1024
+
+_libc = None
+
+
+# -----------------------------------------------------------------------------
+class DirWatcher(object):
+    """
+    Keep a directory index current using inotify events and expose them as a change feed.
+
+    Each indexed directory is watched, so the index is updated entry by entry when files
+    are created, deleted, modified or moved, without rescanning the tree. When the kernel
+    event queue overflows, only the directories with a different modification time are
+    rescanned. Only Linux is supported.
+
+    Arguments:
+        index : DirIndex | str
+    """
+
+    def __init__(self, index):
+        if not isinstance(index, idx.DirIndex):
+            index = idx.DirIndex(index)
+
+        self.index = index
+        self.fd = None
+        self.watches = {}
+        self.paths = {}
+
+    def start(self):
+        """
+        Start watching all directories and bring the index up to date.
+
+        Will throw exception if the platform is not supported.
+
+        Arguments:
+            None
+
+        Returns:
+            DirWatcher
+        """
+
+        if self.fd is not None:
+            return self
+
+        libc = _get_libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+        if fd < 0:
+            raise Exception(
+                "Failed to start directory watcher: {0}".format(
+                    os.strerror(ctypes.get_errno())
+                )
+            )
+
+        self.fd = fd
+        self._watch_tree("")
+
+        return self
+
+    def close(self):
+        """
+        Stop watching and release the inotify descriptor.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+
+        if self.fd is not None:
+            os.close(self.fd)
+
+        self.fd = None
+        self.watches = {}
+        self.paths = {}
+
+    def poll(self, timeout=0):
+        """
+        Wait for events up to timeout seconds, apply them to the index and return them.
+
+        A timeout of None waits until some event arrives.
+
+        Arguments:
+            timeout : float
+
+        Returns:
+            list[tuple[str, str]]
+        """
+
+        if self.fd is None:
+            self.start()
+
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+
+        if not poller.poll(None if timeout is None else int(timeout * 1000)):
+            return []
+
+        events = []
+
+        while True:
+            try:
+                data = os.read(self.fd, EVENT_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+
+            if not data:
+                break
+
+            self._process_data(data, events)
+
+        return events
+
+    def changes(self, timeout=None):
+        """
+        Iterate over the change feed, applying each event to the index.
+
+        The iteration stops when no event arrives in timeout seconds, or never stops if
+        timeout is None.
+
+        Arguments:
+            timeout : float
+
+        Returns:
+            iterator[tuple[str, str]]
+        """
+
+        self.start()
+
+        while self.fd is not None:
+            events = self.poll(timeout)
+
+            if not events and timeout is not None:
+                return
+
+            for event in events:
+                yield event
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _process_data(self, data, events):
+        """
+        Split the data read from the inotify descriptor in events and process each one.
+
+        Arguments:
+            data : bytes
+
+            events : list[tuple[str, str]]
+
+        Returns:
+            None
+        """
+
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            self._process_event(wd, mask, name, events)
+
+    def _process_event(self, wd, mask, name, events):
+        """
+        Apply a single inotify event to the index and add it to the change feed.
+
+        Arguments:
+            wd : int
+
+            mask : int
+
+            name : str
+
+            events : list[tuple[str, str]]
+
+        Returns:
+            None
+        """
+
+        if mask & IN_Q_OVERFLOW:
+            self._process_overflow()
+            _add_event(events, EVENT_OVERFLOW, self.index.path)
+            return
+
+        rel_dir = self.watches.get(wd)
+
+        if rel_dir is None:
+            return
+
+        if mask & IN_IGNORED:
+            self._forget_watch(wd)
+            return
+
+        if mask & IN_DELETE_SELF:
+            if not rel_dir:
+                self.index.dirs = {}
+                _add_event(events, EVENT_DELETED, self.index.path)
+
+            return
+
+        rel_path = os.path.join(rel_dir, name)
+        path = self.index.full_path(rel_path)
+
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            self._remove_watches(rel_path)
+            self.index.update_entry(path)
+
+            if mask & IN_DELETE:
+                _add_event(events, EVENT_DELETED, path)
+            else:
+                _add_event(events, EVENT_MOVED_FROM, path)
+        elif mask & (IN_CREATE | IN_MOVED_TO):
+            flag = self.index.update_entry(path)
+
+            if flag & idx.ENTRY_DIR and (
+                self.index.follow_links or not flag & idx.ENTRY_LINK
+            ):
+                self._watch_tree(rel_path)
+
+            if mask & IN_CREATE:
+                _add_event(events, EVENT_CREATED, path)
+            else:
+                _add_event(events, EVENT_MOVED_TO, path)
+        elif mask & (IN_MODIFY | IN_ATTRIB):
+            self.index.update_entry(path)
+            _add_event(events, EVENT_MODIFIED, path)
+
+    def _process_overflow(self):
+        """
+        Bring the index up to date after events were lost, stating the entries of every watched directory.
+
+        Arguments:
+            None
+
+        Returns:
+            None
+        """
+
+        # changed files keep the directory modification time, so refresh is not enough
+        new_paths = [] if "" in self.paths else [""]
+
+        for rel_path in sorted(self.paths):
+            if rel_path not in self.paths:
+                # removed with the parent directory
+                continue
+
+            new_subdirs = self.index.rescan_dir(self.index.full_path(rel_path))
+
+            if new_subdirs is None:
+                self._remove_watches(rel_path)
+                continue
+
+            for sub_path in new_subdirs:
+                new_paths.append(os.path.join(rel_path, os.path.basename(sub_path)))
+
+        for rel_path in list(self.paths):
+            if rel_path not in self.index.dirs:
+                self._remove_watches(rel_path)
+
+        for rel_path in new_paths:
+            if rel_path not in self.paths:
+                self._watch_tree(rel_path)
+
+    def _watch_tree(self, rel_path):
+        """
+        Watch and scan a directory and all its sub directories that are not watched yet.
+
+        Arguments:
+            rel_path : str
+
+        Returns:
+            None
+        """
+
+        pending = [rel_path]
+
+        while pending:
+            current = pending.pop()
+
+            path = self.index.full_path(current)
+
+            # watch before scanning, so no entry created in between is lost
+            if not self._add_watch(current):
+                self.index.remove_tree(path)
+                continue
+
+            self.index.rescan_dir(path)
+            record = self.index.dirs.get(current)
+
+            if record is None:
+                continue
+
+            for name in record.subdirs(self.index.follow_links):
+                sub_path = os.path.join(current, name)
+
+                if sub_path not in self.paths:
+                    pending.append(sub_path)
+
+    def _add_watch(self, rel_path):
+        """
+        Add an inotify watch to a directory and return if it was added.
+
+        Arguments:
+            rel_path : str
+
+        Returns:
+            bool
+        """
+
+        path = self.index.full_path(rel_path)
+        mask = WATCH_MASK
+
+        if not self.index.follow_links:
+            mask |= IN_DONT_FOLLOW
+
+        wd = _get_libc().inotify_add_watch(self.fd, os.fsencode(path), mask)
+
+        if wd < 0:
+            return False
+
+        old_path = self.watches.get(wd)
+
+        if old_path is not None and old_path != rel_path:
+            # same directory reached by other path
+            self.paths.pop(old_path, None)
+
+        self.watches[wd] = rel_path
+        self.paths[rel_path] = wd
+
+        return True
+
+    def _remove_watches(self, rel_path):
+        """
+        Remove the watches of a directory and all its sub directories.
+
+        Arguments:
+            rel_path : str
+
+        Returns:
+            None
+        """
+
+        prefix = rel_path + os.sep if rel_path else ""
+
+        for x in [x for x in self.paths if x == rel_path or x.startswith(prefix)]:
+            wd = self.paths.pop(x)
+            self.watches.pop(wd, None)
+            _get_libc().inotify_rm_watch(self.fd, wd)
+
+    def _forget_watch(self, wd):
+        """
+        Forget a watch removed by the kernel, like when its directory is deleted.
+
+        Arguments:
+            wd : int
+
+        Returns:
+            None
+        """
+
+        rel_path = self.watches.pop(wd, None)
+
+        if rel_path is not None and self.paths.get(rel_path) == wd:
+            del self.paths[rel_path]
+
+
+# -----------------------------------------------------------------------------
+def watch_dir(path, follow_links=False):
+    """
+    Create and start a watcher with a live index of the directory.
+
+    Will throw exception if the platform is not supported.
+
+    Arguments:
+        path : str
+
+        follow_links : bool
+
+    Returns:
+        DirWatcher
+    """
+
+    return DirWatcher(idx.DirIndex(path, follow_links)).start()
+
+
+# -----------------------------------------------------------------------------
+def _add_event(events, action, path):
+    """
+    Add an event to the change feed, unless it repeats the last one.
+
+    Arguments:
+        events : list[tuple[str, str]]
+
+        action : str
+
+        path : str
+
+    Returns:
+        None
+    """
+
+    event = (action, path)
+
+    # coalesce repeated events, like many writes to the same file
+    if not events or events[-1] != event:
+        events.append(event)
+
+
+# -----------------------------------------------------------------------------
+def _get_libc():
+    """
+    Load the C library with the inotify functions, only once.
+
+    Will throw exception if the platform is not supported.
+
+    Arguments:
+        None
+
+    Returns:
+        ctypes.CDLL
+    """
+
+    global _libc
+
+    if _libc is None:
+        if not p.is_linux():
+            raise Exception("Directory watcher is only supported on Linux")
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_init1.restype = ctypes.c_int
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        libc.inotify_add_watch.restype = ctypes.c_int
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        libc.inotify_rm_watch.restype = ctypes.c_int
+
+        _libc = libc
+
+    return _libc
@@ -1,4 +1,9 @@
+import hashlib
 import os
+import shutil
+import stat
+
+import pytest
 
 import pygemstones.io.file as f
 
@@ -69,6 +74,26 @@ def test_create_file(tmp_path):
     assert f.file_exists(target_file_path)
 
 
+# -----------------------------------------------------------------------------
+def test_create_file_if_changed(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    target_file_path = os.path.join(target_path, "file1.txt")
+
+    assert f.set_file_content(target_file_path, "test\n", if_changed=True)
+    os.utime(target_file_path, (1000000000, 1000000000))
+
+    assert f.set_file_content(target_file_path, "test\n", if_changed=True) == False
+    assert os.stat(target_file_path).st_mtime == 1000000000
+
+    assert f.set_file_content(target_file_path, "tset\n", if_changed=True)
+    assert f.get_file_contents(target_file_path) == "tset\n"
+
+    assert (
+        f.set_file_content(target_file_path, b"tset\n", "wb", if_changed=True) == False
+    )
+    assert f.find_files(target_path, "*") == [target_file_path]
+
+
 # -----------------------------------------------------------------------------
 def test_remove_file(tmp_path):
     target_path = os.path.join(tmp_path, "new-dir")
@@ -215,6 +240,114 @@ def test_find_files_recursive_as_list(tmp_path):
     assert len(files) == 3
 
 
+# -----------------------------------------------------------------------------
+def test_find_files_recursive_with_follow_links(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    linked_path = os.path.join(tmp_path, "linked-dir")
+
+    f.set_file_content(os.path.join(target_path, "A", "file1.txt"), "test")
+    f.set_file_content(os.path.join(linked_path, "file2.txt"), "test")
+    os.symlink(linked_path, os.path.join(target_path, "B"))
+
+    files = f.find_files(target_path, "*.txt", recursive=True)
+    assert len(files) == 1
+
+    files = f.find_files(target_path, "*.txt", recursive=True, follow_links=True)
+    assert len(files) == 2
+
+
+# -----------------------------------------------------------------------------
+def test_compile_pattern():
+    matcher = f.compile_pattern(["file.txt", "*.o", "build*", "lib?.[ch]"])
+
+    assert matcher.match("file.txt")
+    assert matcher.match("main.o")
+    assert matcher.match("build-release")
+    assert matcher.match("liba.h")
+    assert matcher.match("libab.h") == False
+    assert matcher.match("main.c") == False
+
+    assert f.compile_pattern("*").match("anything")
+    assert f.compile_pattern([]).match("anything") == False
+    assert f.compile_pattern(matcher) is matcher
+
+
+# -----------------------------------------------------------------------------
+def test_find_files_with_pattern_matcher(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+
+    f.set_file_content(os.path.join(target_path, "A", "file1.f1"), "test")
+    f.set_file_content(os.path.join(target_path, "B", "file2.f2"), "test")
+    f.set_file_content(os.path.join(target_path, "C", "file3.f3"), "test")
+
+    matcher = f.compile_pattern(["*.f2", "*.f3"])
+
+    files = f.find_files(target_path, matcher, recursive=True)
+    assert len(files) == 2
+
+    f.remove_files(target_path, matcher, recursive=True)
+    files = f.find_files(target_path, "*", recursive=True)
+    assert len(files) == 1
+
+
+# -----------------------------------------------------------------------------
+def test_iter_files(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+
+    f.set_file_content(os.path.join(target_path, "A", "file1.txt"), "test")
+    f.set_file_content(os.path.join(target_path, "B", "file2.txt"), "test")
+    f.set_file_content(os.path.join(target_path, "C", "file3.pdf"), "test")
+
+    files = f.iter_files(target_path, "*.txt", recursive=True)
+    assert os.path.basename(next(files)).startswith("file")
+    files.close()
+
+    entries = list(f.iter_files(target_path, "*", recursive=True, entries=True))
+    assert len(entries) == 3
+    assert all(entry.stat().st_size == 4 for entry in entries)
+
+    assert list(f.iter_files(os.path.join(tmp_path, "invalid"), "*")) == []
+
+
+# -----------------------------------------------------------------------------
+def test_iter_dirs(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+
+    f.create_dir(os.path.join(target_path, "A", "new-dir-a"))
+    f.create_dir(os.path.join(target_path, "B", "new-dir-b"))
+
+    dir_list = list(f.iter_dirs(target_path, "new-dir*", recursive=True))
+    assert len(dir_list) == 2
+
+    entries = list(f.iter_dirs(target_path, "*", entries=True))
+    assert sorted(entry.name for entry in entries) == ["A", "B"]
+
+
+# -----------------------------------------------------------------------------
+def test_find_files_recursive_with_workers(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+
+    for x in range(5):
+        for y in range(5):
+            f.set_file_content(
+                os.path.join(
+                    target_path, "A{0}".format(x), "B{0}".format(y), "file.txt"
+                ),
+                "test",
+            )
+
+    files = f.find_files(target_path, "*.txt", recursive=True, workers=4)
+    assert len(files) == 25
+    assert files == sorted(f.find_files(target_path, "*.txt", recursive=True))
+
+    dir_list = f.find_dirs(target_path, "B*", recursive=True, workers=4)
+    assert len(dir_list) == 25
+    assert dir_list == sorted(dir_list)
+
+    files = f.find_files(os.path.join(tmp_path, "invalid"), "*", True, workers=4)
+    assert files == []
+
+
 # -----------------------------------------------------------------------------
 def test_find_dirs(tmp_path):
     target_path = os.path.join(tmp_path, "new-dir")
@@ -374,6 +507,46 @@ def test_get_file_contents(tmp_path):
     assert contents == "my\ncontent"
 
 
+# -----------------------------------------------------------------------------
+def test_get_file_contents_with_cache(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+    other_file_path = os.path.join(target_path, "file2.txt")
+
+    f.set_file_content(file_path, "my-content")
+    f.set_file_content(other_file_path, "my-other-content")
+
+    f.enable_content_cache(max_bytes=20)
+
+    try:
+        assert f.get_file_contents(file_path) == "my-content"
+        assert f.get_file_contents(file_path) == "my-content"
+        assert f.file_has_content(file_path, "content")
+
+        stats = f.get_content_cache_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 2
+        assert stats["bytes"] == 10
+
+        st = os.stat(file_path)
+        f.replace_in_file(file_path, "my", "xy")
+        os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        assert f.get_file_contents(file_path) == "xy-content"
+        assert f.get_content_cache_stats()["invalidations"] == 1
+
+        assert f.get_file_contents(other_file_path) == "my-other-content"
+
+        stats = f.get_content_cache_stats()
+        assert stats["entries"] == 1
+        assert stats["evictions"] == 1
+    finally:
+        f.disable_content_cache()
+        f.clear_content_cache()
+
+    assert f.get_content_cache_stats()["entries"] == 0
+
+
 # -----------------------------------------------------------------------------
 def test_file_has_content(tmp_path):
     target_path = os.path.join(tmp_path, "new-dir")
@@ -386,6 +559,40 @@ def test_file_has_content(tmp_path):
     assert f.file_has_content(file_path, "xyz") == False
 
 
+# -----------------------------------------------------------------------------
+def test_file_has_content_with_encodings(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+    empty_file_path = os.path.join(target_path, "file2.txt")
+
+    f.set_file_content(file_path, "ação\nconteúdo")
+    f.set_file_content(empty_file_path, "")
+
+    assert f.file_has_content(file_path, "ção")
+    assert f.file_has_content(file_path, "o\nc")
+    assert f.file_has_content(file_path, "xyz") == False
+    assert f.file_has_content(empty_file_path, "xyz") == False
+
+    with open(file_path, "w", encoding="utf-16") as fp:
+        fp.write("ação")
+
+    assert f.file_has_content(file_path, "ção", encoding="utf-16")
+
+
+# -----------------------------------------------------------------------------
+def test_files_have_content(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_list = []
+
+    for x in range(5):
+        file_path = os.path.join(target_path, "file{0}.txt".format(x))
+        f.set_file_content(file_path, "content {0}".format(x % 2))
+        file_list.append(file_path)
+
+    result = f.files_have_content(file_list, "content 1")
+    assert [result[x] for x in file_list] == [False, True, False, True, False]
+
+
 # -----------------------------------------------------------------------------
 def test_copy_file(tmp_path):
     target_path = os.path.join(tmp_path, "new-dir")
@@ -505,6 +712,18 @@ def test_append_to_file(tmp_path):
     assert contents == "my-content-pos"
 
 
+# -----------------------------------------------------------------------------
+def test_append_contents_to_file(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    f.set_file_content(file_path, "my-content")
+    f.append_contents_to_file(file_path, ("-{0}".format(x) for x in range(3)))
+
+    contents = f.get_file_contents(file_path)
+    assert contents == "my-content-0-1-2"
+
+
 # -----------------------------------------------------------------------------
 def test_replace_in_file(tmp_path):
     target_path = os.path.join(tmp_path, "new-dir")
@@ -522,6 +741,79 @@ def test_replace_in_file(tmp_path):
     assert contents == "new-content"
 
 
+# -----------------------------------------------------------------------------
+def test_replace_in_file_if_changed(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    f.set_file_content(file_path, "my-content")
+    os.utime(file_path, (1000000000, 1000000000))
+
+    assert f.replace_in_file(file_path, "xyz", "abc", if_changed=True) == False
+    assert f.replace_in_file(file_path, "my", "my", if_changed=True) == False
+    assert os.stat(file_path).st_mtime == 1000000000
+
+    assert f.replace_in_file(file_path, "my", "new", if_changed=True)
+    assert f.get_file_contents(file_path) == "new-content"
+
+
+# -----------------------------------------------------------------------------
+def test_replace_all_in_file(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    f.set_file_content(file_path, "{name} {name_full} {version}")
+
+    replacements = {"{name}": "{version}", "{name_full}": "abc", "{version}": "1.0"}
+
+    assert f.replace_all_in_file(file_path, replacements)
+    assert f.get_file_contents(file_path) == "{version} abc 1.0"
+
+    assert f.replace_all_in_file(file_path, {"xyz": "abc", "": "abc"}) == False
+
+
+# -----------------------------------------------------------------------------
+def test_replace_in_file_with_chunks(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    f.set_file_content(file_path, "my-content\n" * 100)
+
+    assert f.replace_in_file(file_path, "content\nmy", "xyz", chunk_size=7)
+    assert f.get_file_contents(file_path) == "my-" + "xyz-" * 99 + "content\n"
+
+    changed = f.replace_in_file(file_path, "abc", "xyz", if_changed=True, chunk_size=7)
+    assert changed == False
+    assert f.find_files(target_path, "*") == [file_path]
+
+    f.set_file_content(file_path, "{a}{ab}{a}")
+    replacements = {"{a}": "1", "{ab}": "2"}
+
+    assert f.replace_all_in_file(file_path, replacements, chunk_size=2)
+    assert f.get_file_contents(file_path) == "121"
+
+
+# -----------------------------------------------------------------------------
+def test_replace_all_in_files(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+
+    f.set_file_content(os.path.join(target_path, "A", "file1.txt"), "{name}")
+    f.set_file_content(os.path.join(target_path, "B", "file2.txt"), "{version}")
+    f.set_file_content(os.path.join(target_path, "B", "file3.txt"), "other")
+    f.set_file_content(os.path.join(target_path, "B", "file4.pdf"), "{name}")
+
+    changed = f.replace_all_in_files(
+        target_path, {"{name}": "abc", "{version}": "1.0"}, "*.txt", recursive=True
+    )
+
+    assert sorted(os.path.basename(x) for x in changed) == ["file1.txt", "file2.txt"]
+    assert f.get_file_contents(os.path.join(target_path, "A", "file1.txt")) == "abc"
+    assert f.get_file_contents(os.path.join(target_path, "B", "file4.pdf")) == "{name}"
+
+    file_path = os.path.join(target_path, "B", "file4.pdf")
+    assert f.replace_all_in_files([file_path], {"{name}": "abc"}) == [file_path]
+
+
 # -----------------------------------------------------------------------------
 def test_set_file_line_content(tmp_path):
     target_path = os.path.join(tmp_path, "new-dir")
@@ -534,6 +826,129 @@ def test_set_file_line_content(tmp_path):
     assert contents.strip() == "line x"
 
 
+# -----------------------------------------------------------------------------
+def test_set_file_line_content_keeps_file_on_error(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    f.set_file_content(file_path, "line 1\nline 2\nline 3")
+    os.chmod(file_path, 0o640)
+
+    with pytest.raises(IndexError):
+        f.set_file_line_content(file_path, 10, "line x")
+
+    assert f.get_file_contents(file_path) == "line 1\nline 2\nline 3"
+    assert f.find_files(target_path, "*") == [file_path]
+
+    f.set_file_line_content(file_path, 0, "line x")
+
+    assert f.get_file_contents(file_path) == "line 1\nline 2\nline x"
+    assert os.stat(file_path).st_mode & 0o777 == 0o640
+
+
+# -----------------------------------------------------------------------------
+def test_get_file_line_contents(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    f.set_file_content(file_path, "line 1\nline 2\nline 3")
+
+    assert f.get_file_line_contents(file_path, 1) == "line 1\n"
+    assert f.get_file_line_contents(file_path, 3) == "line 3"
+    assert f.get_file_line_contents(file_path, 0) == "line 3"
+    assert f.get_file_line_contents(file_path, -2) == "line 1\n"
+
+    with pytest.raises(IndexError):
+        f.get_file_line_contents(file_path, 4)
+
+    with pytest.raises(IndexError):
+        f.get_file_line_contents(file_path, -3)
+
+
+# -----------------------------------------------------------------------------
+def test_file_line_functions_with_index(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    f.set_file_content(file_path, "line 1\nline 2\nline 3")
+
+    assert f.get_file_line_contents(file_path, 2, index=True) == "line 2\n"
+    assert f.get_file_line_contents(file_path, 0, index=True) == "line 3"
+    assert f.file_line_has_content(file_path, 3, "line 3", index=True)
+
+    f.set_file_line_content(file_path, 2, "line x\nline y", new_line=True, index=True)
+
+    assert f.get_file_contents(file_path) == "line 1\nline x\nline y\nline 3"
+    assert f.get_file_line_contents(file_path, 4, index=True) == "line 3"
+
+    f.set_file_content(file_path, "line 1")
+    assert f.get_file_line_contents(file_path, 1, index=True) == "line 1"
+
+    with pytest.raises(IndexError):
+        f.get_file_line_contents(file_path, 2, index=True)
+
+    f.clear_line_index_cache()
+
+
+# -----------------------------------------------------------------------------
+def test_set_file_line_content_with_index_in_chunks(tmp_path, monkeypatch):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    monkeypatch.setattr(f, "HASH_BUFFER_SIZE", 5)
+
+    lines = ["line {0}\n".format(x) for x in range(1, 21)]
+    f.set_file_content(file_path, "".join(lines))
+
+    # same length is changed in place
+    inode = os.stat(file_path).st_ino
+    f.set_file_line_content(file_path, 10, "line XY", new_line=True, index=True)
+    lines[9] = "line XY\n"
+
+    assert os.stat(file_path).st_ino == inode
+    assert f.get_file_contents(file_path) == "".join(lines)
+
+    # other length is copied to a temporary file that replaces it
+    f.set_file_line_content(file_path, 12, "longer line", new_line=True, index=True)
+    lines[11] = "longer line\n"
+
+    assert f.get_file_contents(file_path) == "".join(lines)
+    assert f.get_file_line_contents(file_path, 13, index=True) == lines[12]
+    assert f.find_files(target_path, "*") == [file_path]
+
+    f.clear_line_index_cache()
+
+
+# -----------------------------------------------------------------------------
+def test_file_line_functions_with_index_and_carriage_returns(tmp_path):
+    target_file = os.path.join(tmp_path, "file1.txt")
+
+    with open(target_file, "wb") as file:
+        file.write(b"a\rb\nc\n")
+
+    # lone carriage returns are line breaks like the text functions
+    assert f.get_file_line_contents(target_file, 2, index=True) == "b\n"
+    assert f.file_line_has_content(target_file, 3, "c\n", index=True)
+
+    f.set_file_line_content(target_file, 1, "X", True, index=True)
+    assert f.get_file_contents(target_file) == "X\nb\nc\n"
+
+    # carriage return followed by break line in the next chunk
+    with open(target_file, "wb") as file:
+        file.write(b"a\r\nb\r\n")
+
+    with open(target_file, "rb") as file:
+        assert list(f._build_line_starts(file, chunk_size=2)) == [0, 3]
+
+    with open(target_file, "wb") as file:
+        file.write(b"a\rb\r")
+
+    with open(target_file, "rb") as file:
+        assert f._build_line_starts(file, chunk_size=2) is None
+
+    f.clear_line_index_cache()
+
+
 # -----------------------------------------------------------------------------
 def test_file_line_has_content(tmp_path):
     target_path = os.path.join(tmp_path, "new-dir")
@@ -579,6 +994,40 @@ def test_prepend_to_file_line_range(tmp_path):
     assert f.file_line_has_content(file_path, 5, "line 5", strip=True)
 
 
+# -----------------------------------------------------------------------------
+def test_line_edits(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    f.set_file_content(file_path, "line 1\nline 2\nline 3\nline 4\nline 5")
+
+    with f.LineEdits(file_path) as edits:
+        edits.prepend(2, "//")
+        edits.append(2, ";")
+        edits.delete(3)
+        edits.insert(4, "new line")
+        edits.set(0, "last line")
+        edits.append("line 4", " // found")
+
+    contents = f.get_file_contents(file_path)
+    assert contents == "line 1\n//line 2;\nnew line\nline 4 // found\nlast line"
+
+
+# -----------------------------------------------------------------------------
+def test_line_edits_with_invalid_line(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    f.set_file_content(file_path, "line 1\nline 2")
+
+    edits = f.LineEdits(file_path).prepend(1, "//").delete(3)
+
+    with pytest.raises(IndexError):
+        edits.apply()
+
+    assert f.get_file_contents(file_path) == "line 1\nline 2"
+
+
 # -----------------------------------------------------------------------------
 def test_copy_dir(tmp_path):
     target_path = os.path.join(tmp_path, "new-dir")
@@ -756,6 +1205,155 @@ def test_copy_dir_with_symbolic_link_disabled(tmp_path):
     assert len(file_list) == 1
 
 
+# -----------------------------------------------------------------------------
+def test_copy_dir_with_workers(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    dst_path = os.path.join(tmp_path, "dst-dir")
+
+    for x in range(10):
+        f.set_file_content(
+            os.path.join(target_path, "A{0}".format(x), "file.txt"), "test" * x
+        )
+
+    f.set_file_content(os.path.join(target_path, "file.log"), "test")
+    os.symlink(
+        os.path.join(target_path, "file.log"),
+        os.path.join(target_path, "file-symbolic.log"),
+    )
+
+    f.copy_dir(
+        target_path,
+        dst_path,
+        symlinks=True,
+        ignore_file=lambda x: x.endswith("file.log"),
+        workers=4,
+    )
+
+    file_list = f.find_files(dst_path, "*", recursive=True)
+    assert len(file_list) == 11
+    assert os.path.islink(os.path.join(dst_path, "file-symbolic.log"))
+    assert f.file_exists(os.path.join(dst_path, "file.log")) == False
+
+    for x in range(10):
+        file_path = os.path.join(dst_path, "A{0}".format(x), "file.txt")
+        assert f.get_file_contents(file_path) == "test" * x
+
+
+# -----------------------------------------------------------------------------
+def test_copy_dir_with_sync(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    dst_path = os.path.join(tmp_path, "dst-dir")
+
+    f.set_file_content(os.path.join(target_path, "file1.txt"), "test")
+    f.set_file_content(os.path.join(target_path, "A", "file2.txt"), "test")
+
+    summary = f.copy_dir(target_path, dst_path, sync=True)
+    assert len(summary["copied"]) == 2
+    assert len(summary["skipped"]) == 0
+
+    summary = f.copy_dir(target_path, dst_path, sync=True)
+    assert len(summary["copied"]) == 0
+    assert len(summary["skipped"]) == 2
+
+    f.set_file_content(os.path.join(target_path, "file1.txt"), "test-changed")
+    f.set_file_content(os.path.join(dst_path, "extra.txt"), "test")
+    f.create_dir(os.path.join(dst_path, "B"))
+
+    summary = f.copy_dir(target_path, dst_path, sync=True, delete=True)
+    assert summary["copied"] == [os.path.join(dst_path, "file1.txt")]
+    assert summary["skipped"] == [os.path.join(dst_path, "A", "file2.txt")]
+    assert sorted(summary["deleted"]) == [
+        os.path.join(dst_path, "B"),
+        os.path.join(dst_path, "extra.txt"),
+    ]
+    assert f.get_file_contents(os.path.join(dst_path, "file1.txt")) == "test-changed"
+
+
+# -----------------------------------------------------------------------------
+def test_copy_dir_with_sync_and_checksum(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    dst_path = os.path.join(tmp_path, "dst-dir")
+
+    f.set_file_content(os.path.join(target_path, "file1.txt"), "test")
+    f.set_file_content(os.path.join(target_path, "file2.txt"), "test")
+    f.set_file_content(os.path.join(dst_path, "file1.txt"), "test")
+    f.set_file_content(os.path.join(dst_path, "file2.txt"), "abcd")
+
+    summary = f.copy_dir(target_path, dst_path, sync=True, checksum=True)
+    assert summary["copied"] == [os.path.join(dst_path, "file2.txt")]
+    assert summary["skipped"] == [os.path.join(dst_path, "file1.txt")]
+
+
+# -----------------------------------------------------------------------------
+def test_copy_dir_with_link_mode(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "A", "file1.txt")
+
+    f.set_file_content(file_path, "test")
+
+    for link_mode in ["hardlink", "auto"]:
+        dst_path = os.path.join(tmp_path, "dst-dir-" + link_mode)
+        f.copy_dir(target_path, dst_path, link_mode=link_mode)
+
+        dst_file_path = os.path.join(dst_path, "A", "file1.txt")
+        assert os.stat(dst_file_path).st_ino == os.stat(file_path).st_ino
+
+    for link_mode in ["copy", "reflink"]:
+        dst_path = os.path.join(tmp_path, "dst-dir-" + link_mode)
+        f.copy_dir(target_path, dst_path, link_mode=link_mode)
+
+        dst_file_path = os.path.join(dst_path, "A", "file1.txt")
+        assert os.stat(dst_file_path).st_ino != os.stat(file_path).st_ino
+        assert f.get_file_contents(dst_file_path) == "test"
+
+    summary = f.copy_dir(
+        target_path, os.path.join(tmp_path, "dst-dir-hardlink"), sync=True
+    )
+    assert len(summary["skipped"]) == 1
+
+
+# -----------------------------------------------------------------------------
+def test_copy_files_with_link_mode(tmp_path):
+    source_path = os.path.join(tmp_path, "source-dir")
+    target_path = os.path.join(tmp_path, "target-dir")
+
+    f.set_file_content(os.path.join(source_path, "file1.f1"), "test")
+    f.set_file_content(os.path.join(source_path, "file2.f2"), "test")
+    f.set_file_content(os.path.join(target_path, "file1.f1"), "old")
+
+    f.copy_files(source_path, target_path, "*", link_mode="hardlink")
+
+    for name in ["file1.f1", "file2.f2"]:
+        src_stat = os.stat(os.path.join(source_path, name))
+        dst_stat = os.stat(os.path.join(target_path, name))
+        assert os.path.samestat(src_stat, dst_stat)
+
+    with pytest.raises(Exception):
+        f.copy_files(source_path, target_path, "*", link_mode="invalid")
+
+
+# -----------------------------------------------------------------------------
+def test_copy_all_with_workers(tmp_path):
+    source_path = os.path.join(tmp_path, "source-dir")
+    target_path = os.path.join(tmp_path, "target-dir")
+
+    f.set_file_content(os.path.join(source_path, "file1.f1"), "test")
+    f.set_file_content(os.path.join(source_path, "B", "file2.f2"), "test")
+    f.set_file_content(os.path.join(source_path, "B", "C", "file3.f3"), "test")
+    os.symlink(
+        os.path.join(source_path, "B", "file2.f2"),
+        os.path.join(source_path, "B", "file2_symbolic.f2"),
+    )
+    os.utime(os.path.join(source_path, "B"), (1000000000, 1000000000))
+
+    f.copy_all(source_path, target_path, workers=4)
+
+    file_list = f.find_files(target_path, "*", recursive=True)
+    assert len(file_list) == 4
+    assert os.path.islink(os.path.join(target_path, "B", "file2_symbolic.f2"))
+    assert os.stat(os.path.join(target_path, "B")).st_mtime == 1000000000
+
+
 # -----------------------------------------------------------------------------
 def test_get_file_line_number_with_content(tmp_path):
     target_path = os.path.join(tmp_path, "new-dir")
@@ -880,6 +1478,27 @@ def test_get_file_line_numbers_with_content_not_found(tmp_path):
     assert line_numbers == None
 
 
+# -----------------------------------------------------------------------------
+def test_get_file_line_numbers_with_content_with_break_lines(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    f.create_dir(target_path)
+
+    with open(file_path, "wb") as fp:
+        fp.write(b"line 1\r\nline 2\r\n  line 2  \r\nline 22\r\nline 2")
+
+    assert f.get_file_line_number_with_content(file_path, "line 2\n") == 2
+    assert f.get_file_line_numbers_with_content(file_path, "line 2\n") == [2]
+    assert f.get_file_line_numbers_with_content(file_path, "line 2") == [5]
+    assert f.get_file_line_numbers_with_content(file_path, "line 2", strip=True) == [
+        2,
+        3,
+        5,
+    ]
+    assert f.get_file_line_number_with_content(file_path, "line 3") is None
+
+
 # -----------------------------------------------------------------------------
 def test_get_file_line_numbers_with_enclosing_tags_start(tmp_path):
     target_path = os.path.join(tmp_path, "new-dir")
@@ -1099,6 +1718,60 @@ def test_get_file_line_numbers_with_enclosing_tags_with_more_end_than_start_tags
     assert line_numbers[1] == 4
 
 
+# -----------------------------------------------------------------------------
+def test_get_file_blocks_with_enclosing_tags(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    contents = """my_first_function() {
+        my_first_sub_function() {
+        }
+    }
+
+    my_second_function() {
+        a = "}";
+        b = '\\'}';
+        // }
+        /* }
+        } */
+    }
+    }
+    """
+
+    f.set_file_content(file_path, contents)
+
+    blocks = f.get_file_blocks_with_enclosing_tags(file_path, "{", "}")
+    assert blocks == [[1, 4], [6, 7]]
+
+    blocks = f.get_file_blocks_with_enclosing_tags(
+        file_path,
+        "{",
+        "}",
+        nested=True,
+        quotes=['"', "'"],
+        line_comments=["//"],
+        block_comments=[("/*", "*/")],
+    )
+    assert blocks == [[1, 4], [2, 3], [6, 12]]
+
+    blocks = f.get_file_blocks_with_enclosing_tags(file_path, "{", "}", start_from=2)
+    assert blocks == [[2, 3]]
+
+
+# -----------------------------------------------------------------------------
+def test_get_file_blocks_with_enclosing_tags_with_multiple_chars(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    file_path = os.path.join(target_path, "file1.txt")
+
+    f.set_file_content(file_path, "<%\n<% %>\n%>\n<% %>")
+
+    blocks = f.get_file_blocks_with_enclosing_tags(file_path, "<%", "%>")
+    assert blocks == [[1, 3], [4, 4]]
+
+    line_numbers = f.get_file_line_numbers_with_enclosing_tags(file_path, "<%", "%>")
+    assert line_numbers == [1, 3]
+
+
 # -----------------------------------------------------------------------------
 def test_create_symbolic_link(tmp_path):
     source_path = os.path.join(tmp_path, "source-dir")
@@ -1168,3 +1841,521 @@ def test_remove_symbolic_link(tmp_path):
 
     is_link = os.path.islink(os.path.join(source_path, "file_symbolic.txt"))
     assert is_link == False
+
+
+# -----------------------------------------------------------------------------
+def test_hash_file(tmp_path):
+    target_file = os.path.join(tmp_path, "file1.txt")
+    f.set_file_content(target_file, "content1" * 300000)
+
+    assert f.hash_file(target_file) == hashlib.sha256(b"content1" * 300000).hexdigest()
+    assert (
+        f.hash_file(target_file, "md5") == hashlib.md5(b"content1" * 300000).hexdigest()
+    )
+
+
+# -----------------------------------------------------------------------------
+def test_hash_tree(tmp_path):
+    for root in ["dir1", "dir2"]:
+        f.set_file_content(os.path.join(tmp_path, root, "file1.txt"), "content1")
+        f.set_file_content(os.path.join(tmp_path, root, "A", "file2.txt"), "content2")
+        f.set_file_content(os.path.join(tmp_path, root, "A", "file3.log"), "content3")
+
+    dir1 = os.path.join(tmp_path, "dir1")
+    dir2 = os.path.join(tmp_path, "dir2")
+
+    digest = f.hash_tree(dir1)
+    assert digest == f.hash_tree(dir2)
+    assert digest == f.hash_tree(dir1, workers=1)
+
+    # content changes
+    f.set_file_content(os.path.join(dir2, "A", "file3.log"), "content4")
+    assert f.hash_tree(dir2) != digest
+
+    # pattern and ignore semantics
+    assert f.hash_tree(dir1, "*.txt") == f.hash_tree(dir2, "*.txt")
+    assert f.hash_tree(dir1, ignore=shutil.ignore_patterns("*.log")) == f.hash_tree(
+        dir2, ignore_file=lambda x: x.endswith(".log")
+    )
+
+    # non recursive and empty directories
+    assert f.hash_tree(dir1, recursive=False) == f.hash_tree(dir2, recursive=False)
+    f.create_dir(os.path.join(dir2, "B"))
+    assert f.hash_tree(dir1, "*.txt") == f.hash_tree(dir2, "*.txt")
+
+    # renamed file
+    os.rename(os.path.join(dir2, "file1.txt"), os.path.join(dir2, "file5.txt"))
+    assert f.hash_tree(dir1, "*.txt") != f.hash_tree(dir2, "*.txt")
+
+
+# -----------------------------------------------------------------------------
+def test_compile_path_pattern():
+    matcher = f.compile_path_pattern(
+        ["node_modules", "/build", "src/gen", "**/cache/", "docs/**/*.tmp", "*.py[co]"]
+    )
+
+    assert matcher.match("node_modules", True)
+    assert matcher.match("a/b/node_modules", True)
+    assert matcher.match("build", True)
+    assert not matcher.match("a/build", True)
+    assert matcher.match("src/gen", True)
+    assert not matcher.match("a/src/gen", True)
+    assert matcher.match("a/b/cache", True)
+    assert not matcher.match("a/b/cache", False)
+    assert matcher.match("docs/file.tmp")
+    assert matcher.match("docs/a/b/file.tmp")
+    assert not matcher.match("other/file.tmp")
+    assert matcher.match("a/file.pyc")
+    assert not matcher.match("a/file.py")
+
+    assert f.compile_path_pattern(None) is None
+    assert f.compile_path_pattern(matcher) is matcher
+
+
+# -----------------------------------------------------------------------------
+def test_find_files_with_exclude(tmp_path, monkeypatch):
+    f.set_file_content(os.path.join(tmp_path, "file1.txt"), "content1")
+    f.set_file_content(os.path.join(tmp_path, "node_modules", "A", "file2.txt"), "c2")
+    f.set_file_content(os.path.join(tmp_path, "src", "node_modules", "file3.txt"), "c3")
+    f.set_file_content(os.path.join(tmp_path, "src", "build", "file4.txt"), "c4")
+    f.set_file_content(os.path.join(tmp_path, "build", "file5.txt"), "c5")
+    f.set_file_content(os.path.join(tmp_path, "src", "file6.log"), "c6")
+
+    scanned = []
+    scandir = os.scandir
+
+    def scandir_spy(path):
+        scanned.append(str(path))
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", scandir_spy)
+
+    exclude = ["node_modules", "/build", "*.log"]
+    expected = [
+        os.path.join(tmp_path, "file1.txt"),
+        os.path.join(tmp_path, "src", "build", "file4.txt"),
+    ]
+
+    files = f.find_files(tmp_path, "*", recursive=True, exclude=exclude)
+    assert sorted(files) == expected
+
+    # excluded directories are never scanned
+    assert not [x for x in scanned if "node_modules" in x]
+    assert os.path.join(tmp_path, "build") not in scanned
+
+    files = f.find_files(tmp_path, "*", recursive=True, workers=4, exclude=exclude)
+    assert files == expected
+
+    dirs = f.find_dirs(tmp_path, "*", recursive=True, exclude=exclude)
+    assert sorted(dirs) == [
+        os.path.join(tmp_path, "src"),
+        os.path.join(tmp_path, "src", "build"),
+    ]
+
+
+# -----------------------------------------------------------------------------
+def test_remove_files_with_exclude(tmp_path):
+    f.set_file_content(os.path.join(tmp_path, "file1.txt"), "content1")
+    f.set_file_content(os.path.join(tmp_path, ".git", "file2.txt"), "content2")
+
+    f.remove_files(tmp_path, "*.txt", recursive=True, exclude=".git/")
+
+    assert not f.file_exists(os.path.join(tmp_path, "file1.txt"))
+    assert f.file_exists(os.path.join(tmp_path, ".git", "file2.txt"))
+
+    f.remove_dirs(tmp_path, "*", recursive=True, exclude=".git/")
+    assert f.dir_exists(os.path.join(tmp_path, ".git"))
+
+
+# -----------------------------------------------------------------------------
+def test_find_files_with_filters(tmp_path):
+    f.set_file_content(os.path.join(tmp_path, "file1.txt"), "1")
+    f.set_file_content(os.path.join(tmp_path, "A", "file2.txt"), "22")
+    f.set_file_content(os.path.join(tmp_path, "A", "B", "file3.txt"), "333")
+    os.utime(os.path.join(tmp_path, "file1.txt"), (1000, 1000))
+
+    def find(**kwargs):
+        files = f.find_files(tmp_path, "*.txt", recursive=True, **kwargs)
+        return sorted(os.path.relpath(x, tmp_path) for x in files)
+
+    assert find(max_depth=1) == ["file1.txt"]
+    assert find(max_depth=2) == [os.path.join("A", "file2.txt"), "file1.txt"]
+    assert find(min_size=2, max_size=2) == [os.path.join("A", "file2.txt")]
+    assert find(older_than=2000) == ["file1.txt"]
+    assert find(newer_than=2000, workers=4) == [
+        os.path.join("A", "B", "file3.txt"),
+        os.path.join("A", "file2.txt"),
+    ]
+    assert find(max_depth=2, min_size=2, workers=4) == [os.path.join("A", "file2.txt")]
+
+    dirs = f.find_dirs(tmp_path, "*", recursive=True, max_depth=1)
+    assert dirs == [os.path.join(tmp_path, "A")]
+
+
+# -----------------------------------------------------------------------------
+def test_find_files_with_file_type(tmp_path):
+    f.set_file_content(os.path.join(tmp_path, "file1.txt"), "content1")
+    f.symlink(os.path.join(tmp_path, "file1.txt"), os.path.join(tmp_path, "file2.txt"))
+
+    files = f.find_files(tmp_path, "*", recursive=True, file_type="file")
+    assert files == [os.path.join(tmp_path, "file1.txt")]
+
+    files = f.find_files(tmp_path, "*", recursive=True, file_type="link")
+    assert files == [os.path.join(tmp_path, "file2.txt")]
+
+    with pytest.raises(Exception) as info:
+        f.find_files(tmp_path, "*", file_type="invalid")
+
+    assert str(info.value) == "Invalid file type: invalid"
+
+
+# -----------------------------------------------------------------------------
+def test_remove_dir_with_workers(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    outside_file = os.path.join(tmp_path, "outside", "file.txt")
+
+    f.set_file_content(outside_file, "content")
+
+    for x in range(5):
+        f.set_file_content(os.path.join(target_path, str(x), "A", "B", "f.txt"), "c")
+
+    f.set_file_content(os.path.join(target_path, "file1.txt"), "content1")
+    f.symlink(
+        os.path.join(tmp_path, "outside"),
+        os.path.join(target_path, "0", "link"),
+        target_is_directory=True,
+    )
+
+    f.remove_dir(target_path, workers=4)
+
+    assert not os.path.exists(target_path)
+    assert f.file_exists(outside_file)
+
+    # missing directories are ignored
+    f.remove_dir(target_path, workers=4)
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("fd_tree_supported", [True, False])
+def test_remove_files_deep_tree(tmp_path, monkeypatch, fd_tree_supported):
+    if not f.FD_TREE_SUPPORTED and fd_tree_supported:
+        pytest.skip("removal relative to directory descriptors is not supported")
+
+    monkeypatch.setattr(f, "FD_TREE_SUPPORTED", fd_tree_supported)
+
+    deep_path = os.path.join(tmp_path, *["dir"] * 30)
+    f.set_file_content(os.path.join(deep_path, "file1.txt"), "content1")
+    f.set_file_content(os.path.join(deep_path, "file2.log"), "content2")
+    f.set_file_content(os.path.join(tmp_path, "outside", "file3.txt"), "content3")
+    f.symlink(
+        os.path.join(tmp_path, "outside"),
+        os.path.join(tmp_path, "dir", "link"),
+        target_is_directory=True,
+    )
+
+    f.remove_files(tmp_path, "*.txt", recursive=True, exclude="/outside")
+
+    assert not f.file_exists(os.path.join(deep_path, "file1.txt"))
+    assert f.file_exists(os.path.join(deep_path, "file2.log"))
+    assert f.file_exists(os.path.join(tmp_path, "outside", "file3.txt"))
+
+
+# -----------------------------------------------------------------------------
+def test_recreate_dir_background(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+
+    f.set_file_content(os.path.join(target_path, "A", "file1.txt"), "content1")
+    f.recreate_dir(target_path, background=True)
+
+    assert f.dir_exists(target_path)
+    assert os.listdir(target_path) == []
+
+    assert f.wait_pending_removals(timeout=10)
+    assert f.get_pending_removals() == []
+    assert os.listdir(tmp_path) == ["new-dir"]
+
+
+# -----------------------------------------------------------------------------
+def test_recreate_dir_background_removes_stale_trash(tmp_path):
+    target_path = os.path.join(tmp_path, "new-dir")
+    stale_path = os.path.join(tmp_path, ".new-dir" + f.TRASH_DIR_SUFFIX + "old")
+    other_path = os.path.join(tmp_path, ".other-dir" + f.TRASH_DIR_SUFFIX + "old")
+
+    f.set_file_content(os.path.join(stale_path, "file1.txt"), "content1")
+    f.create_dir(other_path)
+
+    assert f.remove_stale_trash(os.path.join(tmp_path, "missing")) == []
+
+    f.recreate_dir(target_path, background=True)
+    assert f.wait_pending_removals(timeout=10)
+
+    assert not os.path.exists(stale_path)
+    assert f.dir_exists(other_path)
+    assert f.dir_exists(target_path)
+
+    f.create_dir(stale_path)
+    assert f.remove_stale_trash(target_path) == [stale_path]
+    assert not os.path.exists(stale_path)
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("workers", [1, 4])
+def test_disk_usage(tmp_path, workers, monkeypatch):
+    # one entry by chunk, so results finish in any order
+    monkeypatch.setattr(f, "DISK_USAGE_CHUNK_SIZE", 1)
+
+    f.set_file_content(os.path.join(tmp_path, "file1.txt"), "1" * 100)
+    f.set_file_content(os.path.join(tmp_path, "A", "file2.txt"), "2" * 2000)
+    f.set_file_content(os.path.join(tmp_path, "A", "B", "file3.txt"), "3" * 300)
+    os.link(
+        os.path.join(tmp_path, "A", "file2.txt"),
+        os.path.join(tmp_path, "A", "B", "file4.txt"),
+    )
+
+    usage = f.disk_usage(tmp_path, top=2, workers=workers)
+
+    assert usage["path"] == str(tmp_path)
+    assert usage["size"] == 2400
+    assert usage["files"] == 3
+    assert usage["dirs"] == 2
+    assert usage["allocated"] > 0
+
+    # the hard link is counted in its first path in sorted order
+    largest = usage["largest"]
+    assert largest == [
+        (os.path.join(tmp_path, "A", "B", "file4.txt"), 2000),
+        (os.path.join(tmp_path, "A", "B", "file3.txt"), 300),
+    ]
+
+    dir_a = usage["directories"][os.path.join(tmp_path, "A")]
+    assert dir_a["size"] == 2300
+    assert dir_a["files"] == 2
+
+    dir_b = usage["directories"][os.path.join(tmp_path, "A", "B")]
+    assert dir_b["size"] == 2300
+    assert dir_b["files"] == 2
+
+    def allocated(*parts):
+        st = os.stat(os.path.join(tmp_path, *parts))
+        blocks = getattr(st, "st_blocks", None)
+        return st.st_size if blocks is None else blocks * 512
+
+    # each directory counts its own blocks, like du command
+    assert dir_b["allocated"] == (
+        allocated("A", "B")
+        + allocated("A", "B", "file3.txt")
+        + allocated("A", "B", "file4.txt")
+    )
+    assert dir_a["allocated"] == allocated("A") + dir_b["allocated"]
+    assert usage["allocated"] == (
+        allocated() + allocated("file1.txt") + dir_a["allocated"]
+    )
+    assert f.disk_usage(os.path.join(tmp_path, ""))["path"] == str(tmp_path)
+
+    assert f.disk_usage(os.path.join(tmp_path, "missing")) is None
+
+
+# -----------------------------------------------------------------------------
+def test_show_disk_usage(tmp_path, capsys):
+    f.set_file_content(os.path.join(tmp_path, "A", "file1.txt"), "1" * 2048)
+
+    f.show_disk_usage(f.disk_usage(tmp_path))
+
+    captured = capsys.readouterr()
+    assert "2 kb" in captured.out
+    assert os.path.join(tmp_path, "A", "file1.txt") in captured.out
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="pipes are not supported")
+def test_copy_dir_with_fifo(tmp_path):
+    src_path = os.path.join(tmp_path, "src")
+    dst_path = os.path.join(tmp_path, "dst")
+
+    f.set_file_content(os.path.join(src_path, "file1.txt"), "content1")
+    os.mkfifo(os.path.join(src_path, "fifo"))
+
+    # special files are not opened, so the copy does not block
+    f.copy_dir(src_path, dst_path)
+
+    assert f.get_file_contents(os.path.join(dst_path, "file1.txt")) == "content1"
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.skipif(os.name == "nt", reason="directory modes are not supported")
+def test_copy_all_read_only_dir(tmp_path):
+    src_path = os.path.join(tmp_path, "src")
+    dst_path = os.path.join(tmp_path, "dst")
+    read_only_path = os.path.join(src_path, "A")
+
+    f.set_file_content(os.path.join(read_only_path, "B", "file1.txt"), "content1")
+    os.chmod(read_only_path, 0o555)
+
+    try:
+        f.copy_all(src_path, dst_path, workers=2)
+
+        target_file = os.path.join(dst_path, "A", "B", "file1.txt")
+        assert f.get_file_contents(target_file) == "content1"
+        assert stat.S_IMODE(os.stat(os.path.join(dst_path, "A")).st_mode) == 0o555
+    finally:
+        os.chmod(read_only_path, 0o755)
+
+        if f.dir_exists(os.path.join(dst_path, "A")):
+            os.chmod(os.path.join(dst_path, "A"), 0o755)
+
+
+# -----------------------------------------------------------------------------
+def test_copy_dir_after_hardlink_copy(tmp_path):
+    src_a = os.path.join(tmp_path, "a")
+    src_b = os.path.join(tmp_path, "b")
+    dst_path = os.path.join(tmp_path, "out")
+
+    f.set_file_content(os.path.join(src_a, "x.txt"), "content-a")
+    f.set_file_content(os.path.join(src_b, "x.txt"), "content-b")
+
+    f.copy_dir(src_a, dst_path, link_mode="hardlink")
+    f.copy_dir(src_b, dst_path)
+
+    assert f.get_file_contents(os.path.join(dst_path, "x.txt")) == "content-b"
+    assert f.get_file_contents(os.path.join(src_a, "x.txt")) == "content-a"
+
+    # a copy of the same source replaces the link with an independent file
+    f.copy_dir(src_a, dst_path, link_mode="hardlink")
+    f.copy_dir(src_a, dst_path)
+
+    assert os.stat(os.path.join(src_a, "x.txt")).st_nlink == 1
+    assert f.get_file_contents(os.path.join(dst_path, "x.txt")) == "content-a"
+
+
+# -----------------------------------------------------------------------------
+def test_line_edits_without_edits(tmp_path):
+    target_file = os.path.join(tmp_path, "file1.txt")
+    f.set_file_content(target_file, "line1\nline2\nline3\n")
+    os.utime(target_file, (1000, 1000))
+
+    f.prepend_to_file_line_range(target_file, 3, 1, "# ")
+    f.LineEdits(target_file).apply()
+
+    assert os.stat(target_file).st_mtime == 1000
+    assert f.get_file_contents(target_file) == "line1\nline2\nline3\n"
+
+
+# -----------------------------------------------------------------------------
+def test_line_edits_negative_lines_count_once(tmp_path, monkeypatch):
+    target_file = os.path.join(tmp_path, "file1.txt")
+    f.set_file_content(target_file, "line1\nline2\nline3\n")
+
+    count_calls = []
+    count_file_lines = f._count_file_lines
+
+    def count_spy(file, encoding="utf-8"):
+        count_calls.append(file)
+        return count_file_lines(file, encoding)
+
+    monkeypatch.setattr(f, "_count_file_lines", count_spy)
+
+    with f.LineEdits(target_file) as edits:
+        edits.append(-1, "!").append(0, "?").delete(-2)
+
+    assert len(count_calls) == 1
+    assert f.get_file_contents(target_file) == "line2!\nline3?\n"
+
+
+# -----------------------------------------------------------------------------
+def test_file_line_number_with_carriage_returns(tmp_path):
+    target_file = os.path.join(tmp_path, "file1.txt")
+
+    with open(target_file, "wb") as file:
+        file.write(b"line1\rline2\rline3\r")
+
+    assert f.get_file_line_number_with_content(target_file, "line2\n") == 2
+    assert f.get_file_line_numbers_with_content(target_file, "line3\n") == [3]
+
+    with open(target_file, "wb") as file:
+        file.write(b"line1\r\nline2\r\n")
+
+    assert f.get_file_line_number_with_content(target_file, "line2\n") == 2
+
+
+# -----------------------------------------------------------------------------
+def test_file_line_number_first_match_reads_until_match(tmp_path, monkeypatch):
+    target_file = os.path.join(tmp_path, "file1.txt")
+
+    with open(target_file, "wb") as file:
+        file.write(b"line1\nline2\n" + b"other\n" * 10000 + b"a\rline2\n")
+
+    scanned = []
+    count_bytes = f._count_bytes
+
+    def count_bytes_spy(data, value, start, end, *args):
+        scanned.append(end)
+        return count_bytes(data, value, start, end, *args)
+
+    monkeypatch.setattr(f, "_count_bytes", count_bytes_spy)
+
+    # the lone carriage return after the match is never read
+    assert f.get_file_line_number_with_content(target_file, "line2\n") == 2
+    assert max(scanned) == len("line1\nline2\n")
+
+    # all matches read the lone carriage return and use the text search
+    assert f.get_file_line_numbers_with_content(target_file, "line2\n") == [2, 10004]
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.skipif(not os.path.exists("/proc/version"), reason="procfs not found")
+def test_file_has_content_in_procfs():
+    # procfs files report size zero but have contents
+    assert os.stat("/proc/version").st_size == 0
+    assert f.file_has_content("/proc/version", "Linux")
+    line = f.get_file_contents("/proc/version").splitlines(True)[0]
+    assert f.get_file_line_number_with_content("/proc/version", line) == 1
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize("chunk_size", [None, 3])
+def test_replace_in_file_same_semantics_with_chunks(tmp_path, chunk_size):
+    target_file = os.path.join(tmp_path, "file1.txt")
+
+    f.set_file_content(target_file, "abcdef")
+    assert f.replace_in_file(target_file, "", "-", chunk_size=chunk_size)
+    assert f.get_file_contents(target_file) == "-a-b-c-d-e-f-"
+
+    f.set_file_content(target_file, "abcdef")
+    os.utime(target_file, (1000, 1000))
+
+    changed = f.replace_in_file(
+        target_file, "xyz", "123", if_changed=True, chunk_size=chunk_size
+    )
+    assert not changed
+    assert os.stat(target_file).st_mtime == 1000
+
+    changed = f.replace_in_file(target_file, "xyz", "123", chunk_size=chunk_size)
+    assert changed
+    assert f.get_file_contents(target_file) == "abcdef"
+
+    changed = f.replace_in_file(
+        target_file, "cd", "12", if_changed=True, chunk_size=chunk_size
+    )
+    assert changed
+    assert f.get_file_contents(target_file) == "ab12ef"
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="pipes are not supported")
+def test_hash_tree_with_fifo(tmp_path):
+    for root in ["dir1", "dir2"]:
+        f.set_file_content(os.path.join(tmp_path, root, "file1.txt"), "content1")
+
+    dir1 = os.path.join(tmp_path, "dir1")
+    dir2 = os.path.join(tmp_path, "dir2")
+
+    os.mkfifo(os.path.join(dir1, "fifo"))
+    f.set_file_content(os.path.join(dir2, "fifo"), "")
+
+    # the pipe is hashed by its type without reading it
+    digest = f.hash_tree(dir1)
+    assert digest != f.hash_tree(dir2)
+
+    f.remove_file(os.path.join(dir2, "fifo"))
+    os.mkfifo(os.path.join(dir2, "fifo"))
+    assert f.hash_tree(dir2) == digest
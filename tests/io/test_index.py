@@ -0,0 +1,198 @@
+import os
+
+import pygemstones.io.file as f
+import pygemstones.io.index as idx
+
+
+# -----------------------------------------------------------------------------
+def create_tree(tmp_path):
+    f.set_file_content(os.path.join(tmp_path, "file1.txt"), "content1")
+    f.set_file_content(os.path.join(tmp_path, "file2.log"), "content2")
+    f.set_file_content(os.path.join(tmp_path, "dir1", "file3.txt"), "content3")
+    f.set_file_content(
+        os.path.join(tmp_path, "dir1", "dir2", "file4.txt"), "content4-bigger"
+    )
+
+
+# -----------------------------------------------------------------------------
+def test_index_find_files(tmp_path):
+    create_tree(tmp_path)
+
+    index = idx.DirIndex(str(tmp_path)).build()
+
+    files = index.find_files("*.txt")
+    assert files == [os.path.join(tmp_path, "file1.txt")]
+
+    files = index.find_files("*.txt", recursive=True)
+    assert files == sorted(f.find_files(str(tmp_path), "*.txt", True))
+    assert len(files) == 3
+
+    files = index.find_files("*.txt", path=os.path.join(tmp_path, "dir1"))
+    assert files == [os.path.join(tmp_path, "dir1", "file3.txt")]
+
+
+# -----------------------------------------------------------------------------
+def test_index_find_dirs(tmp_path):
+    create_tree(tmp_path)
+
+    index = idx.DirIndex(str(tmp_path)).build()
+
+    dirs = index.find_dirs("dir*", recursive=True)
+    assert dirs == sorted(f.find_dirs(str(tmp_path), "dir*", True))
+
+    dirs = index.find_dirs("dir*")
+    assert dirs == [os.path.join(tmp_path, "dir1")]
+
+
+# -----------------------------------------------------------------------------
+def test_index_find_files_sorted(tmp_path):
+    names = ["b.txt", "zeta.txt", "mid.txt", "alpha.txt", "y.txt"]
+
+    for name in names:
+        f.set_file_content(os.path.join(tmp_path, name), name)
+
+    index = idx.DirIndex(str(tmp_path)).build()
+    f.set_file_content(os.path.join(tmp_path, "a.txt"), "a")
+    index.update_entry(os.path.join(tmp_path, "a.txt"))
+
+    expected = [os.path.join(tmp_path, x) for x in sorted(names + ["a.txt"])]
+
+    assert index.find_files("*.txt") == expected
+    assert [x[0] for x in index.entries()] == expected
+
+
+# -----------------------------------------------------------------------------
+def test_index_entries(tmp_path):
+    create_tree(tmp_path)
+
+    index = idx.DirIndex(str(tmp_path)).build()
+    entries = {x[0]: x for x in index.entries()}
+
+    path, flags, size, mtime = entries[
+        os.path.join(tmp_path, "dir1", "dir2", "file4.txt")
+    ]
+    assert flags & idx.ENTRY_FILE
+    assert size == len("content4-bigger")
+    assert mtime > 0
+
+    assert entries[os.path.join(tmp_path, "dir1")][1] & idx.ENTRY_DIR
+
+
+# -----------------------------------------------------------------------------
+def test_index_refresh(tmp_path):
+    create_tree(tmp_path)
+
+    index = idx.DirIndex(str(tmp_path)).build()
+
+    f.set_file_content(os.path.join(tmp_path, "dir1", "dir2", "file5.txt"), "new")
+    f.set_file_content(os.path.join(tmp_path, "dir3", "file6.txt"), "new")
+    f.remove_file(os.path.join(tmp_path, "file1.txt"))
+
+    assert index.refresh() > 0
+
+    files = index.find_files("*.txt", recursive=True)
+    assert files == sorted(f.find_files(str(tmp_path), "*.txt", True))
+    assert os.path.join(tmp_path, "dir3", "file6.txt") in files
+    assert os.path.join(tmp_path, "file1.txt") not in files
+
+    f.remove_dir(os.path.join(tmp_path, "dir1"))
+    index.refresh()
+
+    assert index.find_dirs("*", recursive=True) == [os.path.join(tmp_path, "dir3")]
+    assert os.path.join("dir1", "dir2") not in index.dirs
+
+
+# -----------------------------------------------------------------------------
+def test_index_refresh_unchanged(tmp_path):
+    create_tree(tmp_path)
+
+    index = idx.DirIndex(str(tmp_path)).build()
+
+    # pretend directories were scanned long after they were changed
+    for rel_path, record in index.dirs.items():
+        record.mtime = os.stat(index.full_path(rel_path)).st_mtime_ns
+
+    assert index.refresh() == 0
+
+
+# -----------------------------------------------------------------------------
+def test_index_rescan_and_remove_dir(tmp_path):
+    create_tree(tmp_path)
+
+    index = idx.DirIndex(str(tmp_path)).build()
+    dir1 = os.path.join(tmp_path, "dir1")
+
+    assert index.full_path("") == str(tmp_path)
+    assert index.full_path("dir1") == dir1
+
+    f.set_file_content(os.path.join(dir1, "file5.txt"), "content5")
+    f.set_file_content(os.path.join(dir1, "dir3", "file6.txt"), "content6")
+    f.remove_dir(os.path.join(dir1, "dir2"))
+
+    assert index.rescan_dir(dir1) == [os.path.join(dir1, "dir3")]
+    assert index.find_files("*", path=dir1) == [
+        os.path.join(dir1, "file3.txt"),
+        os.path.join(dir1, "file5.txt"),
+    ]
+    assert index.find_dirs("*", path=dir1) == [os.path.join(dir1, "dir3")]
+    assert os.path.join("dir1", "dir2") not in index.dirs
+    assert os.path.join("dir1", "dir3") not in index.dirs
+
+    index.remove_tree(dir1)
+    assert index.find_files("*", recursive=True) == [
+        os.path.join(tmp_path, "file1.txt"),
+        os.path.join(tmp_path, "file2.log"),
+    ]
+
+    f.remove_dir(dir1)
+    assert index.rescan_dir(dir1) is None
+
+
+# -----------------------------------------------------------------------------
+def test_index_save_and_load(tmp_path):
+    create_tree(os.path.join(tmp_path, "tree"))
+
+    index = idx.DirIndex(os.path.join(tmp_path, "tree")).build()
+    index_file = os.path.join(tmp_path, "cache", "index.json")
+    index.save(index_file)
+
+    loaded = idx.DirIndex.load(index_file)
+
+    assert loaded.path == index.path
+    assert loaded.find_files("*", recursive=True) == index.find_files(
+        "*", recursive=True
+    )
+    assert list(loaded.entries()) == list(index.entries())
+
+
+# -----------------------------------------------------------------------------
+def test_index_load_invalid_file(tmp_path):
+    create_tree(os.path.join(tmp_path, "tree"))
+
+    index_file = os.path.join(tmp_path, "cache", "index.json")
+    assert idx.DirIndex.load(index_file) is None
+
+    f.set_file_content(index_file, "\x80\x04not json")
+    assert idx.DirIndex.load(index_file) is None
+
+    f.set_file_content(index_file, '{"version": 1}')
+    assert idx.DirIndex.load(index_file) is None
+
+    index = idx.DirIndex(os.path.join(tmp_path, "tree")).build()
+    index.save(index_file)
+
+    f.replace_in_file(index_file, '"dirs":{', '"dirs":{"x":[0,["a"],[],[],[]],')
+    assert idx.DirIndex.load(index_file) is None
+
+
+# -----------------------------------------------------------------------------
+def test_index_missing_path(tmp_path):
+    target_path = os.path.join(tmp_path, "missing")
+
+    index = idx.DirIndex(target_path).build()
+    assert index.find_files("*", recursive=True) == []
+
+    f.set_file_content(os.path.join(target_path, "file1.txt"), "content1")
+    index.refresh()
+
+    assert index.find_files("*") == [os.path.join(target_path, "file1.txt")]
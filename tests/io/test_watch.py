@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+import pygemstones.io.file as f
+import pygemstones.io.watch as w
+import pygemstones.system.platform as p
+
+pytestmark = pytest.mark.skipif(not p.is_linux(), reason="inotify is Linux only")
+
+
+# -----------------------------------------------------------------------------
+def test_watch_dir_create_and_delete(tmp_path):
+    f.set_file_content(os.path.join(tmp_path, "file1.txt"), "content1")
+
+    with w.watch_dir(str(tmp_path)) as watcher:
+        target_file = os.path.join(tmp_path, "dir1", "dir2", "file2.txt")
+        f.set_file_content(target_file, "content2")
+        f.remove_file(os.path.join(tmp_path, "file1.txt"))
+
+        events = watcher.poll(1)
+
+        assert (w.EVENT_CREATED, os.path.join(tmp_path, "dir1")) in events
+        assert (w.EVENT_DELETED, os.path.join(tmp_path, "file1.txt")) in events
+
+        files = watcher.index.find_files("*.txt", recursive=True)
+        assert files == [target_file]
+
+        # files created in a watched sub directory
+        f.set_file_content(os.path.join(tmp_path, "dir1", "file3.txt"), "content3")
+        watcher.poll(1)
+
+        files = watcher.index.find_files("*.txt", recursive=True)
+        assert files == sorted(f.find_files(str(tmp_path), "*.txt", True))
+        assert len(files) == 2
+
+
+# -----------------------------------------------------------------------------
+def test_watch_dir_modify_and_move(tmp_path):
+    target_file = os.path.join(tmp_path, "dir1", "file1.txt")
+    f.set_file_content(target_file, "content1")
+
+    with w.watch_dir(str(tmp_path)) as watcher:
+        f.append_to_file(target_file, "more content")
+
+        events = watcher.poll(1)
+        assert (w.EVENT_MODIFIED, target_file) in events
+
+        entries = {x[0]: x for x in watcher.index.entries()}
+        assert entries[target_file][2] == os.path.getsize(target_file)
+
+        os.rename(os.path.join(tmp_path, "dir1"), os.path.join(tmp_path, "dir2"))
+
+        events = watcher.poll(1)
+        assert (w.EVENT_MOVED_FROM, os.path.join(tmp_path, "dir1")) in events
+        assert (w.EVENT_MOVED_TO, os.path.join(tmp_path, "dir2")) in events
+
+        assert watcher.index.find_files("*", recursive=True) == [
+            os.path.join(tmp_path, "dir2", "file1.txt")
+        ]
+
+        # moved directory is still watched
+        f.set_file_content(os.path.join(tmp_path, "dir2", "file2.txt"), "content2")
+
+        events = list(watcher.changes(timeout=0.5))
+        assert (w.EVENT_CREATED, os.path.join(tmp_path, "dir2", "file2.txt")) in events
+
+
+# -----------------------------------------------------------------------------
+def test_watch_dir_overflow(tmp_path):
+    f.set_file_content(os.path.join(tmp_path, "file0.txt"), "0")
+    f.set_file_content(os.path.join(tmp_path, "dir1", "file1.txt"), "content1")
+
+    with w.watch_dir(str(tmp_path)) as watcher:
+        # pretend directories were scanned long after they were changed
+        for rel_path, record in watcher.index.dirs.items():
+            record.mtime = os.stat(watcher.index.full_path(rel_path)).st_mtime_ns
+
+        f.set_file_content(os.path.join(tmp_path, "dir1", "dir2", "file2.txt"), "x")
+
+        # changed file keeps the directory modification time
+        with open(os.path.join(tmp_path, "file0.txt"), "a") as file:
+            file.write("x" * 1000)
+
+        # drop the queued events and simulate a queue overflow
+        os.read(watcher.fd, w.EVENT_BUFFER_SIZE)
+        events = []
+        watcher._process_event(-1, w.IN_Q_OVERFLOW, "", events)
+
+        assert events == [(w.EVENT_OVERFLOW, str(tmp_path))]
+        assert os.path.join("dir1", "dir2") in watcher.paths
+
+        files = watcher.index.find_files("*.txt", recursive=True)
+        assert files == sorted(f.find_files(str(tmp_path), "*.txt", True))
+
+        entries = {x[0]: x for x in watcher.index.entries()}
+        assert entries[os.path.join(tmp_path, "file0.txt")][2] == 1001